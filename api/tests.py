@@ -1,7 +1,34 @@
+import json
+from asyncio import iscoroutinefunction
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from time import sleep
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync, sync_to_async
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Exists, F, Func, IntegerField, OuterRef, Q, Value
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.request import Request
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-from api.models import Problem, Contest, TestCase as TestCaseModel
+from api.models import ContestProblem, Problem, Contest, Submission, TestCase as TestCaseModel
+from simplify_rest_framework import ModelFactory, factories, plan as plan_module, serializer as serializer_module
+from simplify_rest_framework.filters import RequestFilterBackend
+from simplify_rest_framework.instrumentation import HistogramSink, ServerTimingSink
+from simplify_rest_framework.permissions import IsOwner, IsOwnerOrReadOnly, filter_owned, is_owner
+from simplify_rest_framework.serializer import clear_serializer_cache
+from simplify_rest_framework.testing import assert_factories_no_n_plus_one, assert_no_n_plus_one, build_view
+from simplify_rest_framework.view_set import create_view_set
 
 c = Client()
 
@@ -276,3 +303,1062 @@ class TestCaseTestCase(TestCase):
         data = response.json()
         self.assertEqual(data['inputs'], 'fsdaf')
         self.assertEqual(data['output'], 'fdsjfkl')
+
+
+class SerializerCacheTestCase(TestCase):
+    def setUp(self):
+        self.factory = factories._registered_model_factories['TestCase.TestCaseFactory']
+
+    def test_serializer_class_is_reused(self):
+        first = self.factory.get_serializer_class(None)
+        second = self.factory.get_serializer_class(None)
+        self.assertIs(first, second)
+
+    def test_fields_variant_builds_new_serializer(self):
+        first = self.factory.get_serializer_class(None)
+        old_fields = self.factory.fields
+        self.factory.fields = ["inputs", "output", "problem"]
+        try:
+            second = self.factory.get_serializer_class(None)
+        finally:
+            self.factory.fields = old_fields
+        self.assertIsNot(first, second)
+        self.assertEqual(list(second.Meta.fields), ["inputs", "output", "problem"])
+        self.assertIs(self.factory.get_serializer_class(None), first)
+
+    def test_clear_serializer_cache(self):
+        first = self.factory.get_serializer_class(None)
+        clear_serializer_cache(self.factory)
+        self.assertIsNot(self.factory.get_serializer_class(None), first)
+
+
+class FactoryPlanTestCase(TestCase):
+    def setUp(self):
+        self.factory = factories._registered_model_factories['Contest.ContestFactory']
+
+    def test_plan_is_compiled_once(self):
+        self.assertIs(self.factory.get_plan(), self.factory.get_plan())
+
+    def test_plan_contents(self):
+        plan = self.factory.get_plan()
+        self.assertEqual(plan.fields, ("description", "end_time", "start_time", "title", "user", "writers", "testers",
+                                       "writers_detail"))
+        self.assertIn('writers', [getattr(lookup, 'prefetch_to', lookup) for lookup in plan.prefetch_related])
+        self.assertIn('writers_detail', plan.serializer_attrs)
+        with self.assertRaises(AttributeError):
+            plan.fields = ()
+
+    def test_requests_do_not_mutate_factory(self):
+        prefetch_related = set(self.factory.prefetch_related)
+        c.get('/api/contest/')
+        c.get('/api/contest/')
+        self.assertEqual(self.factory.prefetch_related, prefetch_related)
+        self.assertEqual(self.factory.extra_serializer_attrs, {})
+        self.assertEqual(self.factory.annotated_fields, {})
+
+
+class ConcurrentRequestTestCase(TestCase):
+    def setUp(self):
+        self.view_set = factories.get_view_sets()['problem']
+        self.factory = factories._registered_model_factories['Problem.ProblemFactory']
+
+    def resolve_fields(self, method):
+        request = getattr(APIRequestFactory(), method)('/api/problem/')
+        view = self.view_set()
+        view.request = Request(request)
+        view.kwargs = {}
+        view.format_kwarg = None
+        return view.get_serializer_class().Meta.fields
+
+    def test_concurrent_requests_keep_their_fields(self):
+        expected = {
+            'get': self.resolve_fields('get'),
+            'post': self.resolve_fields('post'),
+        }
+        self.assertNotEqual(expected['get'], expected['post'])
+
+        def worker(method):
+            return all(self.resolve_fields(method) == expected[method] for _ in range(200))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(worker, ['get', 'post'] * 8))
+        self.assertTrue(all(results))
+        self.assertEqual(self.factory.fields, self.factory.fields_for_user)
+
+
+class NestedRelationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        for i in range(5):
+            problem = Problem.objects.create(title=f'Problem {i}', description='Description', user=self.user)
+            for j in range(3):
+                TestCaseModel.objects.create(inputs=f'{i} {j}', output=f'{i + j}', problem=problem, user=self.user)
+
+    def test_nested_relation_is_batched(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get('/api/problem/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('created_at', queries[1]['sql'].split(' FROM ')[0])
+        data = response.json()
+        self.assertEqual(len(data), 5)
+        for problem in data:
+            self.assertEqual(len(problem['test_cases']), 3)
+            self.assertEqual(set(problem['test_cases'][0]), {'inputs', 'output'})
+
+    def test_nested_relation_retrieve(self):
+        problem = Problem.objects.first()
+        response = Client().get(f'/api/problem/{problem.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([case['inputs'] for case in response.json()['test_cases']],
+                         [case.inputs for case in problem.testcase_set.all()])
+
+    def test_declared_prefetch_is_not_narrowed(self):
+        factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        factory.fields = [*factory.fields, ('writer_emails', [], ['writers'],
+                                            lambda self, obj: [writer.email for writer in obj.writers.all()])]
+        for i in range(5):
+            writer = User.objects.create_user(username=f'writer{i}', email=f'writer{i}@example.com')
+            Contest.objects.create(title=f'Contest {i}', user=self.user).writers.add(writer)
+        request = APIRequestFactory().get('/')
+        with CaptureQueriesContext(connection) as queries:
+            response = create_view_set(factory).as_view({'get': 'list'})(request)
+        self.assertEqual(sorted(email for row in response.data for email in row['writer_emails']),
+                         [f'writer{i}@example.com' for i in range(5)])
+        # Contests, writers and testers
+        self.assertEqual(len(queries), 3)
+
+
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.problem = Problem.objects.create(title='Test Problem', description='Description', user=self.user)
+        TestCaseModel.objects.create(inputs='1', output='1', problem=self.problem, user=self.user)
+        self.factory = factories._registered_model_factories['Problem.ProblemFactory']
+        self.recorded = []
+        self.histogram = HistogramSink(prefix='srf_metrics_test')
+        self.addCleanup(self.histogram.reset)
+        sinks = [lambda metrics, request, response: self.recorded.append(metrics), ServerTimingSink(),
+                 self.histogram]
+        self.view_set = create_view_set(self.factory, metrics_sinks=sinks)
+
+    def test_action_metrics(self):
+        response = self.view_set.as_view({'get': 'list'})(APIRequestFactory().get('/api/problem/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.recorded), 1)
+        metrics = self.recorded[0]
+        self.assertEqual((metrics.factory, metrics.action), ('Problem.ProblemFactory', 'list'))
+        self.assertEqual(metrics.queries, 2)
+        self.assertGreater(metrics.serialization_time, 0)
+        self.assertGreaterEqual(metrics.total_time, metrics.sql_time)
+        self.assertIn('db;desc="2 queries"', response['Server-Timing'])
+
+    def test_histogram_command(self):
+        view = self.view_set.as_view({'get': 'retrieve'})
+        view(APIRequestFactory().get('/api/problem/'), pk=self.problem.pk)
+        view(APIRequestFactory().get('/api/problem/'), pk=self.problem.pk)
+        self.assertEqual(self.histogram.histograms()[('Problem.ProblemFactory', 'retrieve')]['count'], 2)
+        out = StringIO()
+        call_command('srf_metrics', prefix='srf_metrics_test', stdout=out)
+        self.assertIn('Problem.ProblemFactory retrieve: 2 requests', out.getvalue())
+
+    def test_sql_time_is_not_counted_as_serialization(self):
+        connection.ensure_connection()
+        connection.connection.create_function('srf_sleep', 1, lambda seconds: sleep(seconds) or 0)
+        for i in range(4):
+            Problem.objects.create(title=f'Slow {i}', description='Description')
+        factory = ModelFactory()
+        factory.model = Problem
+        factory.fields = ['title', ('slow', Func(Value(0.02), function='srf_sleep', output_field=IntegerField()))]
+        sinks = [lambda metrics, request, response: self.recorded.append(metrics)]
+        create_view_set(factory, metrics_sinks=sinks).as_view({'get': 'list'})(APIRequestFactory().get('/'))
+        metrics = self.recorded[0]
+        # The queryset runs while the unpaginated list is serialized
+        self.assertGreaterEqual(metrics.sql_time, 0.08)
+        self.assertLess(metrics.serialization_time, metrics.sql_time / 2)
+
+
+class NPlusOneTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='12345')
+
+    def test_registered_factories_have_no_n_plus_one(self):
+        assert_factories_no_n_plus_one(user=self.user)
+
+    def test_n_plus_one_field_is_reported(self):
+        factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        factory.fields = ["title", "writers",
+                          ("staff_writers", [], [], lambda self, obj: obj.writers.filter(is_staff=True).count())]
+        with self.assertRaisesMessage(AssertionError, 'Fields issuing queries per row: staff_writers'):
+            assert_no_n_plus_one(factory, user=self.user)
+
+
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.contest = Contest.objects.create(title='Test Contest', description='Description', user=self.user)
+        self.factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        self.factory.cache = {'timeout': 60}
+        self.view_set = create_view_set(self.factory)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get(self, action='list', **kwargs):
+        response = self.view_set.as_view({'get': action})(APIRequestFactory().get('/api/contest/'), **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_list_is_cached(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(first.content, second.content)
+
+    def test_retrieve_is_cached(self):
+        first = self.get('retrieve', pk=self.contest.pk)
+        with self.assertNumQueries(0):
+            second = self.get('retrieve', pk=self.contest.pk)
+        self.assertEqual(first.content, second.content)
+
+    def test_save_invalidates(self):
+        self.get()
+        self.contest.title = 'Updated Contest'
+        self.contest.save()
+        self.assertEqual(json.loads(self.get().content)[0]['title'], 'Updated Contest')
+
+    def test_related_model_change_invalidates(self):
+        self.get()
+        self.contest.writers.add(self.user)
+        self.assertEqual(json.loads(self.get().content)[0]['writers_detail'][0]['username'], 'testuser')
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(json.loads(self.get().content)[0]['writers_detail'][0]['username'], 'renamed')
+
+    def test_request_scoped_factory_is_cached_per_user(self):
+        other = User.objects.create_user(username='other', password='12345')
+        problem = Problem.objects.create(title='Test Problem', description='Description', user=self.user,
+                                         correct_code='print(1)')
+        factory = factories._registered_model_factories['Problem.ProblemFactory'].for_request(None)
+        factory.cache = {'timeout': 60}
+        view = create_view_set(factory).as_view({'get': 'retrieve'})
+
+        def retrieve(user):
+            request = APIRequestFactory().get('/')
+            force_authenticate(request, user=user)
+            response = view(request, pk=problem.pk)
+            if hasattr(response, 'render'):
+                response.render()
+            return json.loads(response.content)
+
+        self.assertEqual(retrieve(self.user)['correct_code'], 'print(1)')
+        self.assertNotIn('correct_code', retrieve(other))
+        with self.assertNumQueries(0):
+            self.assertEqual(retrieve(self.user)['correct_code'], 'print(1)')
+            self.assertNotIn('correct_code', retrieve(other))
+
+    def test_browsable_api_is_not_cached(self):
+        factory = ModelFactory()
+        factory.model = Contest
+        factory.cache = {'timeout': 60}
+        view = create_view_set(factory).as_view({'get': 'list'})
+        users = [User.objects.create_user(username=username) for username in ['bob_unique_name', 'alice_unique_name']]
+        for user in users:
+            request = APIRequestFactory().get('/api/contest/', HTTP_ACCEPT='text/html')
+            force_authenticate(request, user=user)
+            response = view(request)
+            if hasattr(response, 'render'):
+                response.render()
+            # The navbar shows the requesting user
+            self.assertIn(f'<li class="navbar-text">{user.username}</li>', response.content.decode())
+
+    def test_field_parameters_always_vary(self):
+        factory = factories._registered_model_factories['Problem.ProblemFactory'].for_request(None)
+        factory.cache = {'timeout': 60, 'vary_on_query_params': False}
+        view = create_view_set(factory).as_view({'get': 'list'})
+        Problem.objects.create(title='Test Problem', description='Description', user=self.user)
+
+        def get(query):
+            response = view(APIRequestFactory().get('/', query))
+            if hasattr(response, 'render'):
+                response.render()
+            return json.loads(response.content)[0]
+
+        self.assertEqual(set(get({'fields': 'title'})), {'title'})
+        self.assertIn('description', get({}))
+        self.assertEqual(set(get({'fields': 'title', 'page': '2'})), {'title'})
+
+    def test_annotated_factory_is_invalidated(self):
+        problem = Problem.objects.create(title='Test Problem', description='Description', user=self.user)
+        TestCaseModel.objects.create(inputs='a', user=self.user, problem=problem)
+        factory = factories._registered_model_factories['TestCase.TestCaseFactory'].for_request(None)
+        factory.cache = {'timeout': 60}
+        view = create_view_set(factory).as_view({'get': 'list'})
+        self.assertEqual(view(APIRequestFactory().get('/')).data[0]['problem_title'], 'Test Problem')
+        problem.title = 'Renamed Problem'
+        problem.save()
+        response = view(APIRequestFactory().get('/'))
+        response.render()
+        self.assertEqual(json.loads(response.content)[0]['problem_title'], 'Renamed Problem')
+
+
+class ConditionalRequestTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.contest = Contest.objects.create(title='Test Contest', description='Description', user=self.user)
+        self.factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        self.factory.conditional_field = 'created_at'
+        self.view_set = create_view_set(self.factory)
+
+    def get(self, action='list', **headers):
+        kwargs = {'pk': self.contest.pk} if action == 'retrieve' else {}
+        request = APIRequestFactory().get('/api/contest/', **headers)
+        return self.view_set.as_view({'get': action})(request, **kwargs)
+
+    def test_retrieve_not_modified(self):
+        response = self.get('retrieve')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.get('retrieve', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_changes_when_rows_are_added(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Contest.objects.create(title='Second Contest', description='Description')
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.get('retrieve')['Last-Modified']
+        self.assertEqual(self.get('retrieve', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.get('retrieve', HTTP_IF_MODIFIED_SINCE='Sat, 01 Jan 2000 00:00:00 GMT').status_code,
+                         200)
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.problem = Problem.objects.create(title='Test Problem', description='Description', user=self.user)
+        created_at = timezone.now()
+        for i in range(7):
+            # Pairs of submissions share created_at to exercise the primary key tiebreaker
+            Submission.objects.create(user=self.user, problem=self.problem, code=f'code {i}', language='python',
+                                      verdict='AC' if i % 2 else 'WA', created_at=created_at - timedelta(i // 2))
+        self.api_url = '/api/submission/'
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = c.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertLessEqual(len(data['results']), 3)
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        return ids
+
+    def test_walk_pages(self):
+        expected = list(Submission.objects.order_by('-created_at', 'pk').values_list('id', flat=True))
+        self.assertEqual(self.collect(self.api_url + '?page_size=3'), expected)
+
+    def test_indexable_ordering_param(self):
+        expected = list(Submission.objects.order_by('created_at', 'pk').values_list('id', flat=True))
+        self.assertEqual(self.collect(self.api_url + '?page_size=3&ordering=created_at'), expected)
+
+    def test_non_indexable_ordering_falls_back_to_meta_ordering(self):
+        expected = list(Submission.objects.order_by('-created_at', 'pk').values_list('id', flat=True))
+        self.assertEqual(self.collect(self.api_url + '?page_size=3&ordering=verdict'), expected)
+
+    def test_foreign_key_ordering(self):
+        # Problem's Meta.ordering differs from the order of their ids
+        for i in range(3):
+            problem = Problem.objects.create(title=f'Problem {i}', description='Description', difficulty=3000 - i)
+            Submission.objects.create(user=self.user, problem=problem, code='code', language='python')
+        expected = list(Submission.objects.order_by('problem_id', 'pk').values_list('id', flat=True))
+        self.assertEqual(self.collect(self.api_url + '?page_size=3&ordering=problem'), expected)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(c.get(self.api_url + '?cursor=invalid').status_code, 404)
+
+
+class StreamingListTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        for i in range(5):
+            contest = Contest.objects.create(title=f'Contest {i}', description='Description', user=self.user)
+            contest.writers.add(self.user)
+        self.factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        self.factory.streaming_list = True
+        self.factory.streaming_chunk_size = 2
+
+    def test_streamed_list_matches_regular_list(self):
+        request = APIRequestFactory().get('/api/contest/')
+        response = create_view_set(self.factory).as_view({'get': 'list'})(request)
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(streamed, c.get('/api/contest/').json())
+
+    def test_streamed_list_metrics(self):
+        recorded = []
+        sinks = [lambda metrics, request, response: recorded.append(metrics)]
+        view = create_view_set(self.factory, metrics_sinks=sinks).as_view({'get': 'list'})
+        response = view(APIRequestFactory().get('/api/contest/'))
+        self.assertEqual(recorded, [])
+        with CaptureQueriesContext(connection) as queries:
+            b''.join(response.streaming_content)
+        self.assertEqual(len(recorded), 1)
+        # Contests, then writers and testers of each chunk of 2 rows
+        self.assertEqual(recorded[0].queries, len(queries))
+        self.assertGreater(recorded[0].queries, 1)
+        self.assertGreater(recorded[0].serialization_time, 0)
+
+    def test_empty_list(self):
+        Contest.objects.all().delete()
+        request = APIRequestFactory().get('/api/contest/')
+        response = create_view_set(self.factory).as_view({'get': 'list'})(request)
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+
+class PermissionCacheTestCase(TestCase):
+    def test_permissions_are_compiled_once(self):
+        factory = factories._registered_model_factories['Contest.ContestFactory']
+        first = factory.get_permissions(None)
+        second = factory.for_request(None).get_permissions(None)
+        self.assertEqual([type(permission) for permission in first], [IsOwnerOrReadOnly, IsAuthenticatedOrReadOnly])
+        self.assertEqual(first[0].owner_fields, ['user', 'writers', 'testers'])
+        self.assertTrue(all(a is b for a, b in zip(first, second)))
+        self.assertIn('class', factory.permission_classes[0])
+
+
+class OwnershipTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='12345')
+        self.writer = User.objects.create_user(username='writer', password='12345')
+        self.other = User.objects.create_user(username='other', password='12345')
+        self.contest = Contest.objects.create(title='Owned', user=self.owner)
+        self.contest.writers.add(self.writer, self.owner)
+        self.contest.testers.add(self.writer)
+        Contest.objects.create(title='Not owned', user=self.other)
+        self.owner_fields = ['user', 'writers', 'testers']
+
+    def test_foreign_key_owner_needs_no_query(self):
+        contest = Contest.objects.get(pk=self.contest.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_owner(contest, self.owner_fields, self.owner))
+
+    def test_many_to_many_owner_single_query(self):
+        contest = Contest.objects.get(pk=self.contest.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_owner(contest, self.owner_fields, self.writer))
+        with self.assertNumQueries(1):
+            self.assertFalse(is_owner(contest, self.owner_fields, self.other))
+
+    def test_filter_owned(self):
+        owned = filter_owned(Contest.objects.all(), self.owner_fields, self.writer)
+        self.assertEqual(list(owned.values_list('title', flat=True)), ['Owned'])
+        owned = filter_owned(Contest.objects.all(), self.owner_fields, self.other)
+        self.assertEqual(list(owned.values_list('title', flat=True)), ['Not owned'])
+
+    def test_permission_filters_list(self):
+        factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        factory.permission_classes = [{'class': IsOwner, 'owner_fields': self.owner_fields}]
+        view = create_view_set(factory).as_view({'get': 'list'})
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.writer)
+        self.assertEqual([contest['title'] for contest in view(request).data], ['Owned'])
+        # Filtered lists are cached per user
+        factory.cache = {'timeout': 60}
+        self.addCleanup(cache.clear)
+        view = create_view_set(factory).as_view({'get': 'list'})
+        view(request)
+        other_request = APIRequestFactory().get('/')
+        force_authenticate(other_request, user=self.other)
+        response = view(other_request)
+        response.render()
+        self.assertEqual([contest['title'] for contest in json.loads(response.content)], ['Not owned'])
+        factory.cache = None
+        factory.permission_classes = [{'class': IsOwnerOrReadOnly, 'owner_fields': self.owner_fields}]
+        view = create_view_set(factory).as_view({'get': 'list'})
+        self.assertEqual(len(view(request).data), 2)
+
+
+class RowFilterTestCase(TestCase):
+    def setUp(self):
+        self.writer = User.objects.create_user(username='writer', password='12345')
+        self.other = User.objects.create_user(username='other', password='12345')
+        self.owned = Contest.objects.create(title='Owned', user=self.other)
+        self.owned.writers.add(self.writer)
+        self.not_owned = Contest.objects.create(title='Not owned', user=self.other)
+        self.factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        self.factory.row_filter = {'owner_fields': ['user', 'writers', 'testers']}
+
+    def request(self, action, method='get', **kwargs):
+        request = getattr(APIRequestFactory(), method)('/api/contest/')
+        force_authenticate(request, user=self.writer)
+        return create_view_set(self.factory).as_view({method: action})(request, **kwargs)
+
+    def test_list_is_filtered(self):
+        response = self.request('list')
+        self.assertEqual([contest['title'] for contest in response.data], ['Owned'])
+
+    def test_object_outside_filter_is_not_found(self):
+        self.assertEqual(self.request('retrieve', pk=self.owned.pk).status_code, 200)
+        self.assertEqual(self.request('retrieve', pk=self.not_owned.pk).status_code, 404)
+
+    def test_unauthorized_readonly(self):
+        self.factory.row_filter['unauthorized_readonly'] = True
+        self.assertEqual(len(self.request('list').data), 2)
+        self.assertEqual(self.request('destroy', method='delete', pk=self.not_owned.pk).status_code, 404)
+        self.assertEqual(self.request('destroy', method='delete', pk=self.owned.pk).status_code, 204)
+
+
+class BulkActionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other = User.objects.create_user(username='other', password='12345')
+        self.problem = Problem.objects.create(title='Test Problem', description='Test Description', user=self.user)
+        self.api = '/api/test-case/bulk/'
+
+    def test_bulk_create(self):
+        c.force_login(self.user)
+        items = [{'inputs': f'input {i}', 'output': f'output {i}', 'problem': self.problem.id} for i in range(100)]
+        with CaptureQueriesContext(connection) as queries:
+            response = c.post(self.api, data=items, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertLess(len(queries), 20)
+        data = response.json()
+        self.assertEqual([item['inputs'] for item in data], [item['inputs'] for item in items])
+        self.assertEqual(data[0]['problem_title'], 'Test Problem')
+        self.assertEqual(TestCaseModel.objects.filter(user=self.user).count(), 100)
+
+    def test_bulk_create_is_atomic(self):
+        c.force_login(self.user)
+        items = [{'inputs': 'input', 'problem': self.problem.id}, {'inputs': 'input', 'problem': 0}]
+        response = c.post(self.api, data=items, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(TestCaseModel.objects.count(), 0)
+
+    def test_bulk_delete_checks_object_permissions(self):
+        owned = TestCaseModel.objects.create(inputs='a', user=self.user, problem=self.problem)
+        other = TestCaseModel.objects.create(inputs='b', user=self.other, problem=self.problem)
+        c.force_login(self.user)
+        response = c.delete(self.api, data=[owned.id, other.id], content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(TestCaseModel.objects.count(), 2)
+        response = c.delete(self.api, data={'ids': [owned.id]}, content_type='application/json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(TestCaseModel.objects.values_list('id', flat=True)), [other.id])
+
+    def test_bulk_update(self):
+        factory = factories._registered_model_factories['TestCase.TestCaseFactory'].for_request(None)
+        factory.bulk_actions = ['update']
+        factory.disabled_actions = []
+        first = TestCaseModel.objects.create(inputs='a', user=self.user, problem=self.problem)
+        second = TestCaseModel.objects.create(inputs='b', user=self.user, problem=self.problem)
+        data = [{'id': first.id, 'output': 'x'}, {'id': second.id, 'output': 'y'}]
+        request = APIRequestFactory().patch(self.api, data, format='json')
+        force_authenticate(request, user=self.user)
+        response = create_view_set(factory).as_view({'patch': 'bulk'})(request)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([item['output'] for item in response.data], ['x', 'y'])
+        self.assertEqual(TestCaseModel.objects.get(id=second.id).output, 'y')
+        self.assertEqual(c.post(self.api, data=[], content_type='application/json').status_code, 403)
+
+    def test_bulk_writes_invalidate_cache(self):
+        factory = factories._registered_model_factories['TestCase.TestCaseFactory'].for_request(None)
+        factory.bulk_actions = ['create', 'update']
+        factory.disabled_actions = []
+        factory.cache = {'timeout': 60}
+        view_set = create_view_set(factory)
+        self.addCleanup(cache.clear)
+
+        def inputs():
+            response = view_set.as_view({'get': 'list'})(APIRequestFactory().get('/'))
+            if hasattr(response, 'render'):
+                response.render()
+            return sorted(item['inputs'] for item in json.loads(response.content))
+
+        def bulk(method, data):
+            request = getattr(APIRequestFactory(), method)(self.api, data, format='json')
+            force_authenticate(request, user=self.user)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = view_set.as_view({method: 'bulk'})(request)
+            self.assertLess(response.status_code, 300, response.data)
+            return response
+
+        self.assertEqual(inputs(), [])
+        response = bulk('post', [{'inputs': 'a', 'problem': self.problem.pk}])
+        self.assertEqual(inputs(), ['a'])
+        bulk('patch', [{'id': response.data[0]['id'], 'inputs': 'b'}])
+        self.assertEqual(inputs(), ['b'])
+
+
+class AsyncViewSetTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.problem = Problem.objects.create(title='Test Problem', description='Test Description', user=self.user)
+        self.first = TestCaseModel.objects.create(inputs='a', user=self.user, problem=self.problem)
+        self.second = TestCaseModel.objects.create(inputs='b', user=self.user, problem=self.problem)
+        self.factory = factories._registered_model_factories['TestCase.TestCaseFactory'].for_request(None)
+        self.factory.async_views = True
+
+    def view(self, actions, method='get', data=None):
+        request = getattr(APIRequestFactory(), method)('/api/test-case/', data, format='json')
+        force_authenticate(request, user=self.user)
+        view = create_view_set(self.factory).as_view(actions)
+        self.assertTrue(iscoroutinefunction(view))
+        return view, request
+
+    async def test_list_and_retrieve(self):
+        view, request = self.view({'get': 'list'})
+        response = await view(request)
+        self.assertEqual([item['inputs'] for item in response.data], ['a', 'b'])
+        self.assertEqual(response.data[0]['problem_title'], 'Test Problem')
+        view, request = self.view({'get': 'retrieve'})
+        response = await view(request, pk=self.second.pk)
+        self.assertEqual(response.data['inputs'], 'b')
+        response = await view(request, pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_metrics_count_worker_thread_queries(self):
+        recorded = []
+        self.factory.metrics_sinks = [lambda metrics, request, response: recorded.append(metrics)]
+        view, request = self.view({'get': 'list'})
+        response = await view(request)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(recorded[0].queries, 1)
+        self.assertGreater(recorded[0].sql_time, 0)
+
+    async def test_coroutine_hooks(self):
+        async def get_queryset(view):
+            return TestCaseModel.objects.annotate(problem_title=F('problem__title')).filter(inputs='b')
+
+        async def create_instance(serializer, validated_data):
+            return await sync_to_async(TestCaseModel.objects.create)(**validated_data, output='async')
+
+        self.factory.get_queryset = get_queryset
+        self.factory.create_instance = create_instance
+        view, request = self.view({'get': 'list'})
+        response = await view(request)
+        self.assertEqual([item['inputs'] for item in response.data], ['b'])
+        view, request = self.view({'post': 'create'}, 'post', {'inputs': 'c', 'problem': self.problem.pk})
+        response = await view(request)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['output'], 'async')
+
+    def test_sync_client(self):
+        self.factory.streaming_list = True
+        with self.assertRaises(ValueError):
+            create_view_set(self.factory)
+        self.factory.streaming_list = False
+        request = APIRequestFactory().get('/api/test-case/')
+        response = async_to_sync(create_view_set(self.factory).as_view({'get': 'list'}))(request)
+        self.assertEqual(len(response.data), 2)
+
+
+class ColumnPruningTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.problem = Problem.objects.create(title='Test Problem', description='Test Description', user=self.user,
+                                              correct_code='print(1)')
+        for verdict in ['AC', 'WA', 'TLE']:
+            Submission.objects.create(user=self.user, problem=self.problem, code='print(1)', language='python',
+                                      verdict=verdict)
+
+    def select_sql(self, factory):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        view = create_view_set(factory).as_view({'get': 'list'})
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'].split(' FROM ')[0] for query in queries.captured_queries]
+
+    def test_excluded_fields_are_not_loaded(self):
+        factory = ModelFactory()
+        factory.model = Problem
+        factory.excluded_fields = ['correct_code', 'checker_function']
+        response, queries = self.select_sql(factory)
+        self.assertNotIn('correct_code', response.data[0])
+        problem_queries = [sql for sql in queries if '"api_problem"."description"' in sql]
+        self.assertEqual(len(problem_queries), 1)
+        self.assertNotIn('correct_code', problem_queries[0])
+        self.assertNotIn('checker_function', problem_queries[0])
+
+    def test_nested_relations_are_joined(self):
+        factory = factories._registered_model_factories['Submission.ModelFactory'].for_request(None)
+        factory.fields = ['problem', 'verdict']
+        factory.serializer_depth = 1
+        response, queries = self.select_sql(factory)
+        self.assertEqual(response.data['results'][0]['problem']['correct_code'], 'print(1)')
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"api_submission"."code"', queries[0])
+
+
+class JoinInferenceTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        for index in range(3):
+            contest = Contest.objects.create(title=f'Contest {index}', user=self.user)
+            contest.writers.add(self.user)
+            contest.testers.add(self.user)
+
+    def test_depth_relations_are_inferred(self):
+        factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        factory.fields = ['title', 'user', 'writers', 'testers']
+        factory.serializer_depth = 1
+        plan = factory.get_plan()
+        self.assertEqual(plan.select_related, {'user'})
+        lookups = [prefetch.prefetch_to for prefetch in plan.prefetch_related]
+        self.assertEqual(lookups[:2], ['testers', 'writers'])
+        # Nested users render their groups and permissions as primary keys
+        self.assertIn('writers__groups', lookups)
+        self.assertIn('user__groups', lookups)
+        request = APIRequestFactory().get('/api/contest/')
+        with self.assertNumQueries(1 + len(lookups)):
+            response = create_view_set(factory).as_view({'get': 'list'})(request)
+        self.assertEqual(response.data[0]['writers'][0]['username'], 'testuser')
+        self.assertEqual(response.data[0]['user']['username'], 'testuser')
+
+    def test_dry_run_report(self):
+        out = StringIO()
+        call_command('srf_plan', 'Contest.ContestFactory', stdout=out)
+        self.assertIn('prefetch_related: testers (inferred) only: id', out.getvalue())
+
+
+class SparseFieldsetTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.problem = Problem.objects.create(title='Test Problem', description='Test Description', user=self.user)
+        TestCaseModel.objects.create(inputs='a', user=self.user, problem=self.problem)
+
+    def get(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(f'/api/problem/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), [query['sql'] for query in queries.captured_queries]
+
+    def test_fields(self):
+        data, queries = self.get('fields=title,difficulty,unknown')
+        self.assertEqual(set(data[0]), {'title', 'difficulty'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"api_problem"."description"', queries[0])
+
+    def test_omit(self):
+        data, queries = self.get('omit=test_cases,description')
+        self.assertNotIn('test_cases', data[0])
+        self.assertIn('title', data[0])
+        self.assertFalse(any('api_testcase' in sql for sql in queries))
+
+    def test_variant_serializer_is_cached(self):
+        request = APIRequestFactory().get('/api/problem/?fields=title')
+        view = build_view(create_view_set(factories._registered_model_factories['Problem.ProblemFactory']))
+        view.request = view.initialize_request(request)
+        first = view.get_serializer_class()
+        view._factory = None
+        self.assertIs(view.get_serializer_class(), first)
+        self.assertEqual(list(first.Meta.fields), ['title'])
+
+    def test_custom_serializer_class_is_not_narrowed(self):
+        class ProblemSerializer(ModelSerializer):
+            class Meta:
+                model = Problem
+                fields = ['id', 'title', 'description']
+
+        for i in range(4):
+            Problem.objects.create(title=f'Problem {i}', description='Test Description')
+        factory = ModelFactory()
+        factory.model = Problem
+        factory.serializer_class = ProblemSerializer
+        factory.sparse_fieldsets = True
+        with CaptureQueriesContext(connection) as queries:
+            response = create_view_set(factory).as_view({'get': 'list'})(APIRequestFactory().get('/?fields=title'))
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'description'})
+        self.assertEqual(len(queries), 1)
+
+    def test_variant_caches_are_bounded(self):
+        fields = ['title', 'description', 'difficulty', 'memory_limit', 'time_limit', 'notice']
+        with patch.object(serializer_module._serializer_cache, 'max_size', 4), \
+                patch.object(plan_module._plan_cache, 'max_size', 4):
+            for count in range(1, len(fields) + 1):
+                for offset in range(len(fields)):
+                    data, _ = self.get(f'fields={",".join((fields * 2)[offset:offset + count])}')
+                    self.assertEqual(len(data[0]), count)
+            self.assertLessEqual(len(serializer_module._serializer_cache), 4)
+            self.assertLessEqual(len(plan_module._plan_cache), 4)
+
+
+class ExpandableFieldTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        for index in range(3):
+            Contest.objects.create(title=f'Contest {index}', user=self.user).writers.add(self.user)
+        self.factory = factories._registered_model_factories['Contest.ContestFactory'].for_request(None)
+        self.factory.expandable_fields = ['writers_detail']
+
+    def get(self, query=''):
+        request = APIRequestFactory().get(f'/api/contest/{query}')
+        with CaptureQueriesContext(connection) as queries:
+            response = create_view_set(self.factory).as_view({'get': 'list'})(request)
+        return response.data, [query['sql'] for query in queries.captured_queries]
+
+    def test_pks_without_expand(self):
+        data, queries = self.get()
+        self.assertEqual(data[0]['writers_detail'], [self.user.pk])
+        self.assertFalse(any('"auth_user"."username"' in sql for sql in queries))
+
+    def test_expand(self):
+        data, queries = self.get('?expand=writers_detail')
+        self.assertEqual(data[0]['writers_detail'][0]['username'], 'testuser')
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(self.get()[0][0]['writers_detail'], [self.user.pk])
+
+
+class CountlessPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        problem = Problem.objects.create(title='Test Problem', description='Test Description', user=self.user)
+        for _ in range(5):
+            Submission.objects.create(user=self.user, problem=problem, code='print(1)', language='python')
+        self.factory = factories._registered_model_factories['Submission.ModelFactory'].for_request(None)
+        self.factory.pagination_style = 'countless'
+        self.factory.page_size = 2
+
+    def get(self, query=''):
+        request = APIRequestFactory().get(f'/api/submission/{query}')
+        with CaptureQueriesContext(connection) as queries:
+            response = create_view_set(self.factory).as_view({'get': 'list'})(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [query['sql'] for query in queries.captured_queries]
+
+    def test_pages_without_count(self):
+        data, queries = self.get()
+        self.assertEqual(len(data['results']), 2)
+        self.assertNotIn('count', data)
+        self.assertFalse(any('COUNT(' in sql for sql in queries))
+        self.assertTrue(data['next'].endswith('?page=2'))
+        data, _ = self.get('?page=3')
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNone(data['next'])
+        self.assertTrue(data['previous'].endswith('?page=2'))
+
+    def test_cached_count(self):
+        self.factory.page_count_timeout = 30
+        data, queries = self.get()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(len([sql for sql in queries if 'COUNT(' in sql]), 1)
+        data, queries = self.get('?page=2')
+        self.assertEqual(data['count'], 5)
+        self.assertFalse(any('COUNT(' in sql for sql in queries))
+        # Each filter combination has its own cached count
+        self.factory.filterset_fields = ['verdict']
+        data, _ = self.get('?verdict=AC')
+        self.assertEqual(data['count'], 0)
+
+
+class FastReadTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.problem = Problem.objects.create(title='Test Problem', description='Test Description', user=self.user)
+        for index in range(3):
+            TestCaseModel.objects.create(inputs=f'input {index}', user=self.user, problem=self.problem)
+            Submission.objects.create(user=self.user, problem=self.problem, code='print(1)', language='python')
+
+    def list(self, key, fast_read, **options):
+        factory = factories._registered_model_factories[key].for_request(None)
+        factory.fast_read = fast_read
+        for name, value in options.items():
+            setattr(factory, name, value)
+        request = APIRequestFactory().get('/')
+        with CaptureQueriesContext(connection) as queries:
+            response = create_view_set(factory).as_view({'get': 'list'})(request)
+        response.render()
+        return response, queries
+
+    def test_output_matches_serializer(self):
+        for key, options in [('TestCase.TestCaseFactory', {}), ('User.UserFactory', {}),
+                             ('Submission.ModelFactory', {'pagination_style': 'countless'})]:
+            expected, _ = self.list(key, False, **options)
+            response, queries = self.list(key, True, **options)
+            self.assertEqual(response.content, expected.content)
+            # Rows are plain dicts built from values(), not serializer output
+            rows = response.data['results'] if options else response.data
+            self.assertIs(type(rows[0]), dict)
+            self.assertEqual(len(queries), 1)
+
+    def test_unsupported_fields_use_serializer(self):
+        expected, _ = self.list('Contest.ContestFactory', False)
+        response, _ = self.list('Contest.ContestFactory', True)
+        self.assertEqual(response.content, expected.content)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('srf_benchmark', 'TestCase.TestCaseFactory', rows=20, repeat=1, stdout=out)
+        self.assertIn('fast_read:', out.getvalue())
+        self.assertNotIn('differs', out.getvalue())
+        self.assertEqual(TestCaseModel.objects.count(), 3)
+
+
+class AnnotatedFieldTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.problem = Problem.objects.create(title='First', description='Test Description', user=self.user)
+        self.other_problem = Problem.objects.create(title='Second', description='Test Description', user=self.user)
+        self.factory = factories._registered_model_factories['TestCase.TestCaseFactory'].for_request(None)
+        self.factory.disabled_actions = []
+        self.factory.fields = [*self.factory.fields, ('problem_created_at', 'problem__created_at')]
+
+    def request(self, action, method, data=None, **kwargs):
+        request = getattr(APIRequestFactory(), method)('/api/test-case/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return create_view_set(self.factory).as_view({method: action})(request, **kwargs)
+
+    def test_typed_read_only_fields(self):
+        fields = self.factory.get_serializer_class(None)().fields
+        self.assertEqual(type(fields['problem_title']).__name__, 'CharField')
+        self.assertEqual(type(fields['problem_created_at']).__name__, 'DateTimeField')
+        self.assertTrue(fields['problem_title'].read_only)
+
+    def test_annotations_after_create_and_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request('create', 'post', {'inputs': 'a', 'problem': self.problem.pk})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['problem_title'], 'First')
+        self.assertEqual(response.data['problem_created_at'],
+                         self.request('list', 'get').data[0]['problem_created_at'])
+        # Problem lookup, insert and one re-fetch of the annotations
+        self.assertEqual(len(queries), 3)
+        response = self.request('partial_update', 'patch', {'problem': self.other_problem.pk}, pk=response.data['id'])
+        self.assertEqual(response.data['problem_title'], 'Second')
+
+
+class ExpressionFieldTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other = User.objects.create_user(username='other', password='12345')
+        self.solved = Problem.objects.create(title='Solved', description='Test Description', user=self.user)
+        self.unsolved = Problem.objects.create(title='Unsolved', description='Test Description', user=self.user)
+        for user, verdict in [(self.user, 'AC'), (self.user, 'AC'), (self.other, 'AC'), (self.user, 'WA')]:
+            Submission.objects.create(user=user, problem=self.solved, code='print(1)', language='python',
+                                      verdict=verdict)
+        self.factory = ModelFactory()
+        self.factory.model = Problem
+        self.factory.fields = [
+            'id', 'title',
+            ('accepted_users', Count('submission__user', filter=Q(submission__verdict='AC'), distinct=True)),
+            ('solved', lambda request: Exists(Submission.objects.filter(
+                problem=OuterRef('pk'), user=request.user.pk, verdict='AC'))),
+        ]
+
+    def test_typed_fields(self):
+        fields = self.factory.get_serializer_class(None)().fields
+        self.assertEqual(type(fields['accepted_users']).__name__, 'IntegerField')
+        self.assertTrue(fields['accepted_users'].read_only)
+        self.assertEqual(type(fields['solved']).__name__, 'ReadOnlyField')
+
+    def test_request_aware_annotations_in_one_query(self):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.other)
+        with CaptureQueriesContext(connection) as queries:
+            response = create_view_set(self.factory).as_view({'get': 'list'})(request)
+        self.assertEqual(len(queries), 1)
+        rows = {row['title']: row for row in response.data}
+        self.assertEqual(rows['Solved']['accepted_users'], 2)
+        self.assertEqual(rows['Solved']['solved'], True)
+        self.assertEqual(rows['Unsolved']['accepted_users'], 0)
+        self.assertEqual(rows['Unsolved']['solved'], False)
+
+
+class RequestFilterTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        past = timezone.now() - timedelta(days=1)
+        self.solved = Problem.objects.create(title='Solved', description='Test Description', hidden_till=past)
+        self.unsolved = Problem.objects.create(title='Unsolved', description='Test Description', hidden_till=past)
+        self.upcoming = Problem.objects.create(title='Upcoming', description='Test Description',
+                                               hidden_till=timezone.now() + timedelta(days=1))
+        Submission.objects.create(user=self.user, problem=self.solved, code='print(1)', language='python',
+                                  verdict='AC')
+        contest = Contest.objects.create(title='Contest', start_time=timezone.now() + timedelta(days=1))
+        contest.testers.add(self.user)
+        ContestProblem.objects.create(contest=contest, problem=self.upcoming)
+        self.view = create_view_set(factories._registered_model_factories['Problem.ProblemFactory'])
+
+    def get_titles(self, query):
+        request = APIRequestFactory().get('/', query)
+        force_authenticate(request, user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view.as_view({'get': 'list'})(request)
+        self.assertEqual(response.status_code, 200)
+        return {row['title'] for row in response.data}, queries.captured_queries
+
+    def test_filters_run_in_one_query(self):
+        titles, queries = self.get_titles({'unsolved_problems': '1'})
+        self.assertEqual(titles, {'Unsolved'})
+        problem_queries = [query['sql'] for query in queries if 'FROM "api_problem"' in query['sql']]
+        self.assertEqual(len(problem_queries), 1)
+        self.assertIn('EXISTS', problem_queries[0])
+        self.assertEqual(self.get_titles({'test_problems': '1'})[0], {'Upcoming'})
+        self.assertEqual(self.get_titles({'unsolved_problems': '0'})[0], {'Solved', 'Unsolved', 'Upcoming'})
+
+    def test_filters_in_browsable_api(self):
+        request = Request(APIRequestFactory().get('/', {'test_problems': '1'}))
+        html = RequestFilterBackend().to_html(request, Problem.objects.all(), build_view(self.view, self.user))
+        self.assertIn('name="unsolved_problems"', html)
+        self.assertIn('name="test_problems" value="1" checked', html)
+
+    def test_invalid_request_filter(self):
+        factory = ModelFactory()
+        factory.model = Problem
+        factory.request_filters = {'bad': 'title'}
+        request = APIRequestFactory().get('/', {'bad': '1'})
+        with self.assertRaises(ValueError):
+            create_view_set(factory).as_view({'get': 'list'})(request)
+
+
+class FieldVariantTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='12345')
+        self.other = User.objects.create_user(username='other', password='12345')
+        self.problem = Problem.objects.create(title='Test Problem', description='Test Description', user=self.owner,
+                                              correct_code='print(1)')
+        self.view_set = factories.get_view_sets()['problem']
+
+    def retrieve(self, user):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view_set.as_view({'get': 'retrieve'})(request, pk=self.problem.pk)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_variant_picked_without_extra_queries(self):
+        response, queries = self.retrieve(self.owner)
+        self.assertEqual(response.data['correct_code'], 'print(1)')
+        # Problem and its test cases, ownership comes from the fetched row
+        self.assertEqual(queries, 2)
+        response, queries = self.retrieve(self.other)
+        self.assertNotIn('correct_code', response.data)
+        self.assertEqual(queries, 2)
+
+    def test_serializer_cached_per_variant(self):
+        self.problem.user = self.other
+        serializers = set()
+        for user, obj in [(self.owner, None), (self.other, None), (self.owner, self.problem),
+                          (self.other, self.problem)]:
+            view = build_view(self.view_set, user, action='retrieve', pk=self.problem.pk)
+            view.factory.object = obj
+            serializers.add(view.get_serializer_class())
+        self.assertEqual(len(serializers), 2)
+
+    def test_unknown_variant(self):
+        factory = ModelFactory()
+        factory.model = Problem
+        factory.field_variants = {'public': ['title']}
+        factory.default_field_variant = 'private'
+        with self.assertRaises(ValueError):
+            factory.get_serializer_class(build_view(create_view_set(factory)))
@@ -1,4 +1,4 @@
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.urls import path, include
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
@@ -10,7 +10,7 @@ from .models import ContestProblem, Contest, Problem, Comment, TestCase, Submiss
 
 factories.register(ContestProblem)
 factories.register(Comment)
-factories.register(Submission)
+factories.register(Submission, pagination_style='keyset')
 factories.register(Tutorial)
 
 
@@ -36,6 +36,17 @@ class UserFactory(ModelFactory):
         self.create_instance = create_user
 
 
+def unsolved_problems(request):
+    solved = Submission.objects.filter(problem=OuterRef('pk'), user=request.user.pk, verdict='AC')
+    return ~Exists(solved) & Q(hidden_till__lt=timezone.now())
+
+
+def test_problems(request):
+    contests = Contest.objects.filter(Q(writers=request.user.pk) | Q(testers=request.user.pk),
+                                      problems=OuterRef('pk'), start_time__gt=timezone.now())
+    return Exists(contests)
+
+
 @register(Problem)
 class ProblemFactory(ModelFactory):
     def __init__(self):
@@ -52,37 +63,22 @@ class ProblemFactory(ModelFactory):
                                 "input_terms", "memory_limit", "notice", "output_terms", "time_limit", "title", "user",
                                 ("test_cases", "testcase_set", ["inputs", "output"])
                                 ]
+        self.fields = self.fields_for_user
+        self.field_variants = {'owner': self.fields_for_owner, 'public': self.fields_for_user}
+        self.default_field_variant = 'public'
+        self.owner_field_variant = {'variant': 'owner', 'owner_fields': ['user']}
         self.filterset_fields = ['user', 'submission__verdict', 'submission__user']
+        self.sparse_fieldsets = True
+        self.request_filters = {
+            'unsolved_problems': unsolved_problems,
+            'test_problems': test_problems,
+        }
 
     def validate(self, self2, attrs):
         if attrs.get('difficulty', 500) < 500:
             raise ValidationError("Difficulty must be greater than 500")
         return attrs
 
-    def get_queryset(self, self2):
-        if self2.request.GET.get('unsolved_problems'):
-            solved_ids = [problem.id for
-                          problem in Problem.objects.only('id').filter(submission__verdict='AC',
-                                                                       submission__user=self2.request.user)]
-            return Problem.objects.exclude(id__in=solved_ids).filter(hidden_till__lt=timezone.now())
-        if self2.request.GET.get('test_problems'):
-            q = Q(contest__writers=self2.request.user) | Q(contest__testers=self2.request.user)
-            return Problem.objects.filter(q, contest__start_time__gt=timezone.now())
-        return super().get_queryset(self2)
-
-    def get_serializer_class(self, self2):
-        request = self2.request
-        if self2.kwargs.get('pk'):
-            if Problem.objects.filter(pk=self2.kwargs.get('pk')).exists():
-                if self2.request.user == Problem.objects.filter(pk=self2.kwargs.get('pk')).first().user:
-                    self.fields = self.fields_for_owner
-        elif request.method == 'POST':
-            self.fields = self.fields_for_owner
-            super().get_serializer_class(self2)
-        else:
-            self.fields = self.fields_for_user
-        return super().get_serializer_class(self2)
-
 
 @register(Contest)
 class ContestFactory(ModelFactory):
@@ -101,6 +97,7 @@ class ContestFactory(ModelFactory):
 class TestCaseFactory(ModelFactory):
     def __init__(self):
         super().__init__()
+        self.bulk_actions = ['create', 'delete']
         self.disabled_actions = ['update', 'partial_update']
         self.fields = ["inputs", "output", "problem", ("problem_title", "problem__title"), "id"]
         self.auto_user_field = "user"
@@ -28,7 +28,8 @@ setup(
         'Framework :: Django',
         'Framework :: Django :: 4.0',
     ],
-    packages=['simplify_rest_framework'],
+    packages=['simplify_rest_framework', 'simplify_rest_framework.management',
+              'simplify_rest_framework.management.commands'],
     include_package_data=True,
     install_requires=["django >= 3.2.0", "django-filter >= 21.1.0"],
 )
@@ -0,0 +1,126 @@
+from asyncio import iscoroutinefunction
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.response import Response
+
+from .cache import get_cached_response
+from .conditional import get_not_modified_response
+from .fast_read import fast_list
+from .hooks import acall_hook
+
+
+async def afetch(queryset) -> list:
+    """
+    Evaluate a queryset with the async ORM when Django has it (4.1+). aiterator() skips prefetch_related,
+    so such querysets are evaluated in a worker thread instead.
+    """
+    if hasattr(queryset, 'aiterator') and not queryset._prefetch_related_lookups:
+        return [row async for row in queryset.aiterator()]
+    return await sync_to_async(list)(queryset)
+
+
+async def aget(queryset, **kwargs):
+    if hasattr(queryset, 'aget'):
+        return await queryset.aget(**kwargs)
+    return await sync_to_async(queryset.get)(**kwargs)
+
+
+def create_async_view_set(view_set):
+    """
+    Create an async counterpart of a generated view set for ASGI deployments.
+    list and retrieve run on the event loop and only hop to a worker thread for authentication, filtering,
+    pagination and serialization. Other actions run in a worker thread. Factory hooks may be coroutines.
+
+    :param view_set: View set class returned by create_view_set
+    :return: View set class whose as_view returns a coroutine function
+    """
+
+    class AsyncFactoryViewSet(view_set):
+        @classmethod
+        def as_view(cls, actions=None, **initkwargs):
+            view = super().as_view(actions, **initkwargs)
+
+            async def async_view(request, *args, **kwargs):
+                return await view(request, *args, **kwargs)
+
+            # Keeps cls, actions, initkwargs and csrf_exempt for the router and the CSRF middleware
+            return update_wrapper(async_view, view)
+
+        async def dispatch(self, request, *args, **kwargs):
+            self.args = args
+            self.kwargs = kwargs
+            request = self.initialize_request(request, *args, **kwargs)
+            self.request = request
+            self.headers = self.default_response_headers
+            try:
+                # Authentication may hit the session and user tables
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                if request.method.lower() in self.http_method_names:
+                    handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+                else:
+                    handler = self.http_method_not_allowed
+                if iscoroutinefunction(handler):
+                    response = await handler(request, *args, **kwargs)
+                else:
+                    response = await sync_to_async(handler)(request, *args, **kwargs)
+            except Exception as exc:
+                response = self.handle_exception(exc)
+            self.response = await sync_to_async(self.finalize_response)(request, response, *args, **kwargs)
+            return self.response
+
+        def get_early_response(self, request):
+            return get_not_modified_response(self, request) or get_cached_response(self, request)
+
+        def serialize(self, instance, many=False):
+            return self.get_serializer(instance, many=many).data
+
+        async def afilter_queryset(self):
+            if iscoroutinefunction(self.factory.get_queryset):
+                queryset = self.factory.filter_rows(self, await self.factory.get_queryset(self))
+                return await sync_to_async(self.filter_queryset)(queryset)
+            return await sync_to_async(lambda: self.filter_queryset(self.get_queryset()))()
+
+        async def aget_object(self):
+            if callable(self.factory.get_object):
+                self.factory.object = await acall_hook(self.factory.get_object, self)
+                return self.factory.object
+            queryset = await self.afilter_queryset()
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            try:
+                obj = await aget(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+                raise Http404
+            await sync_to_async(self.check_object_permissions)(self.request, obj)
+            self.factory.object = obj
+            return obj
+
+        async def list(self, request, *args, **kwargs):
+            if 'list' in self.factory.disabled_actions:
+                raise MethodNotAllowed(request.method)
+            response = await sync_to_async(self.get_early_response)(request)
+            if response is None and self.factory.fast_read:
+                response = await sync_to_async(fast_list)(self)
+            if response is not None:
+                return response
+            queryset = await self.afilter_queryset()
+            page = await sync_to_async(self.paginate_queryset)(queryset)
+            if page is not None:
+                return self.get_paginated_response(await sync_to_async(self.serialize)(page, many=True))
+            rows = await afetch(queryset)
+            return Response(await sync_to_async(self.serialize)(rows, many=True))
+
+        async def retrieve(self, request, *args, **kwargs):
+            if 'retrieve' in self.factory.disabled_actions:
+                raise MethodNotAllowed(request.method)
+            response = await sync_to_async(self.get_early_response)(request)
+            if response is not None:
+                return response
+            instance = await self.aget_object()
+            return Response(await sync_to_async(self.serialize)(instance))
+
+    AsyncFactoryViewSet.__name__ = view_set.__name__
+    return AsyncFactoryViewSet
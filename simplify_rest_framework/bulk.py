@@ -0,0 +1,216 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections, router, transaction
+from rest_framework import status
+from rest_framework.exceptions import MethodNotAllowed, NotFound, ValidationError
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from .cache import invalidate_model
+from .hooks import call_hook
+
+# Bulk action -> HTTP methods of the bulk endpoint
+BULK_METHODS = {
+    'create': ['post'],
+    'update': ['put', 'patch'],
+    'delete': ['delete'],
+}
+# HTTP method -> single action whose disabled_actions entry also disables the bulk method
+BULK_SINGLE_ACTIONS = {
+    'post': 'create',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}
+
+
+def get_bulk_methods(factory) -> list:
+    """
+    HTTP methods of the bulk endpoint of a factory
+
+    :param factory: ModelFactory instance
+    :return: ['post', 'put', 'patch', 'delete'] or a subset of it
+    """
+    if type(factory.bulk_actions) != list:
+        raise ValueError('bulk_actions must be a list')
+    unknown = set(factory.bulk_actions) - set(BULK_METHODS)
+    if unknown:
+        raise ValueError(f'Unknown bulk_actions {unknown}')
+    return [method for action in factory.bulk_actions for method in BULK_METHODS[action]]
+
+
+def split_many_to_many(model, data: dict) -> tuple:
+    """
+    Pop many to many values, they can only be set once the row exists
+
+    :return: (concrete values, many to many values)
+    """
+    many_to_many = {}
+    for field in model._meta.many_to_many:
+        if field.name in data:
+            many_to_many[field.name] = data.pop(field.name)
+    return data, many_to_many
+
+
+def preload_related(serializers, items) -> None:
+    """
+    Resolve the primary keys of every related field with one query per field,
+    instead of one query per item while validating
+
+    :param serializers: Item serializers sharing the same fields
+    :param items: Raw data of the items
+    """
+    for name, field in serializers[0].fields.items():
+        many = isinstance(field, ManyRelatedField)
+        relation = field.child_relation if many else field
+        if field.read_only or type(relation) != PrimaryKeyRelatedField or relation.pk_field is not None:
+            continue
+        pks = set()
+        for item in items:
+            value = item.get(name) if type(item) == dict else None
+            pks.update(pk for pk in (value if many and type(value) == list else [value]) if type(pk) in (int, str))
+        if not pks:
+            continue
+        try:
+            objects = {str(pk): obj for pk, obj in relation.get_queryset().in_bulk(pks).items()}
+        except (TypeError, ValueError, DjangoValidationError):
+            # Left to the field, which reports the invalid value
+            continue
+        for serializer in serializers:
+            item_field = serializer.fields[name]
+            item_relation = item_field.child_relation if many else item_field
+            original = item_relation.to_internal_value
+            item_relation.to_internal_value = (
+                lambda data, objects=objects, original=original: objects.get(str(data)) or original(data))
+
+
+def get_ids(data, lookup_field: str) -> list:
+    if type(data) == dict:
+        data = data.get('ids')
+    if type(data) != list or not data:
+        raise ValidationError({'ids': 'Expected a non empty list of ids'})
+    ids = [item.get(lookup_field, item.get('id')) if type(item) == dict else item for item in data]
+    if None in ids:
+        raise ValidationError({lookup_field: 'Every item must have an id'})
+    return ids
+
+
+def get_instances(view, request, ids) -> list:
+    """
+    Fetch the objects of the ids with one query and check object permissions of each one
+    """
+    queryset = view.filter_queryset(view.get_queryset())
+    instances = {str(getattr(instance, view.lookup_field)): instance
+                 for instance in queryset.filter(**{f'{view.lookup_field}__in': ids})}
+    missing = [value for value in ids if str(value) not in instances]
+    if missing:
+        raise NotFound(f'Not found: {missing}')
+    result = [instances[str(value)] for value in ids]
+    for instance in result:
+        view.check_object_permissions(request, instance)
+    return result
+
+
+def serialize_saved(view, instances) -> list:
+    """
+    Serialize written rows after fetching them again with one query, so annotated fields are filled in
+    """
+    fetched = view.get_queryset().in_bulk([instance.pk for instance in instances])
+    # Rows hidden by the view's queryset are serialized as written
+    instances = [fetched.get(instance.pk, instance) for instance in instances]
+    return view.get_serializer(instances, many=True).data
+
+
+def bulk_create(view, request) -> Response:
+    if type(request.data) != list:
+        raise ValidationError('Expected a list of items')
+    serializer = view.get_serializer(data=request.data, many=True)
+    preload_related([serializer.child], request.data)
+    serializer.is_valid(raise_exception=True)
+    factory = view.factory
+    model = factory.model
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        if callable(factory.create_instance):
+            instances = [call_hook(factory.create_instance, serializer.child, dict(data))
+                         for data in serializer.validated_data]
+        else:
+            rows = [split_many_to_many(model, dict(data)) for data in serializer.validated_data]
+            instances = [model(**data) for data, _ in rows]
+            if connections[using].features.can_return_rows_from_bulk_insert:
+                model._default_manager.db_manager(using).bulk_create(instances)
+            else:
+                # Primary keys are needed for many to many values and the response
+                for instance in instances:
+                    instance.save(using=using)
+            for instance, (_, many_to_many) in zip(instances, rows):
+                for name, value in many_to_many.items():
+                    getattr(instance, name).set(value)
+        # bulk_create() sends no post_save signal
+        transaction.on_commit(lambda: invalidate_model(model), using=using)
+    return Response(serialize_saved(view, instances), status=status.HTTP_201_CREATED)
+
+
+def bulk_update(view, request) -> Response:
+    if type(request.data) != list:
+        raise ValidationError('Expected a list of items')
+    partial = request.method == 'PATCH'
+    instances = get_instances(view, request, get_ids(request.data, view.lookup_field))
+    serializers = [view.get_serializer(instance, data=data, partial=partial)
+                   for instance, data in zip(instances, request.data)]
+    preload_related(serializers, request.data)
+    errors = [serializer.errors if not serializer.is_valid() else {} for serializer in serializers]
+    if any(errors):
+        raise ValidationError(errors)
+    factory = view.factory
+    model = factory.model
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        if callable(factory.update_instance):
+            instances = [call_hook(factory.update_instance, serializer, instance, dict(serializer.validated_data))
+                         for serializer, instance in zip(serializers, instances)]
+        else:
+            fields = set()
+            many_to_many = []
+            for serializer, instance in zip(serializers, instances):
+                data, relations = split_many_to_many(model, dict(serializer.validated_data))
+                for name, value in data.items():
+                    setattr(instance, name, value)
+                fields.update(data)
+                many_to_many.append(relations)
+            if fields:
+                model._default_manager.bulk_update(instances, sorted(fields))
+            for instance, relations in zip(instances, many_to_many):
+                for name, value in relations.items():
+                    getattr(instance, name).set(value)
+        # bulk_update() sends no post_save signal
+        transaction.on_commit(lambda: invalidate_model(model), using=using)
+    return Response(serialize_saved(view, instances))
+
+
+def bulk_delete(view, request) -> Response:
+    instances = get_instances(view, request, get_ids(request.data, view.lookup_field))
+    model = view.factory.model
+    with transaction.atomic(using=router.db_for_write(model)):
+        model._default_manager.filter(pk__in=[instance.pk for instance in instances]).delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+BULK_HANDLERS = {
+    'create': bulk_create,
+    'update': bulk_update,
+    'delete': bulk_delete,
+}
+
+
+def bulk(view, request) -> Response:
+    """
+    Handle the bulk endpoint of a generated view set.
+    POST creates a list of items, PUT / PATCH update a list of items carrying their ids
+    and DELETE removes a list of ids, each in a single transaction.
+    """
+    factory = view.factory
+    method = request.method.lower()
+    action = next((name for name in factory.bulk_actions if method in BULK_METHODS[name]), None)
+    if action is None or BULK_SINGLE_ACTIONS[method] in factory.disabled_actions:
+        raise MethodNotAllowed(request.method)
+    return BULK_HANDLERS[action](view, request)
@@ -0,0 +1,231 @@
+from hashlib import md5
+
+from django.core.cache import caches
+from django.db.models import F, Prefetch
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.db.models.sql import Query
+from django.http import HttpResponse
+from rest_framework.response import Response
+from rest_framework.utils import model_meta
+
+from .filters import get_active_filters
+from .model_factory import EXPAND_PARAM, SPARSE_FIELDS_PARAM, SPARSE_OMIT_PARAM, get_compiled_permissions
+
+DEFAULT_CACHE_OPTIONS = {
+    'alias': 'default',  # Django cache alias
+    'timeout': 60,  # Seconds a response is kept
+    'vary_on_user': False,  # Cache responses per user
+    'vary_on_query_params': True,  # Cache responses per query parameters
+}
+CACHED_ACTIONS = ['list', 'retrieve']
+
+# Model -> {(factory name, cache alias)} whose responses depend on the model
+_dependents = {}
+
+
+def get_factory_name(factory) -> str:
+    return f'{factory.model.__name__}.{factory.__class__.__name__}'
+
+
+def get_cache_options(factory) -> dict | None:
+    if not factory.cache:
+        return None
+    if type(factory.cache) != dict:
+        raise ValueError('cache must be a dict')
+    unknown = set(factory.cache) - set(DEFAULT_CACHE_OPTIONS)
+    if unknown:
+        raise ValueError(f'Unknown cache options {unknown}')
+    return {**DEFAULT_CACHE_OPTIONS, **factory.cache}
+
+
+def resolve_lookup_models(model, lookup: str) -> list:
+    """
+    Models traversed by a lookup such as 'problem__user'
+    """
+    models = []
+    for part in lookup.split('__'):
+        relations = model_meta.get_field_info(model).relations
+        if part not in relations:
+            break
+        model = relations[part].related_model
+        models.append(model)
+    return models
+
+
+def get_dependent_models(factory) -> set:
+    """
+    The factory's model and every model it selects, prefetches or annotates from
+    """
+    plan = factory.get_plan()
+    lookups = [prefetch.prefetch_to if isinstance(prefetch, Prefetch) else prefetch
+               for prefetch in plan.prefetch_related]
+    lookups.extend(plan.select_related)
+    lookups.extend(plan.fields)
+    models = {factory.model}
+    for expression in plan.annotations.values():
+        # F is not an Expression and has no flatten() before Django 4.1
+        for node in [expression] if isinstance(expression, F) else expression.flatten():
+            if isinstance(node, F):
+                lookups.append(node.name)
+            elif isinstance(getattr(node, 'query', None), Query):
+                # Subquery and Exists read their own model
+                models.add(node.query.model)
+    for lookup in lookups:
+        models.update(resolve_lookup_models(factory.model, lookup))
+    return models
+
+
+def version_key(name: str) -> str:
+    return f'srf_cache:{name}:version'
+
+
+def invalidate(name: str, alias: str = 'default') -> None:
+    """
+    Invalidate every cached response of a factory
+
+    :param name: Factory name, e.g. 'Contest.ContestFactory'
+    :param alias: Django cache alias
+    """
+    cache = caches[alias]
+    if not cache.add(version_key(name), 1, None):
+        try:
+            cache.incr(version_key(name))
+        except ValueError:
+            cache.set(version_key(name), 1, None)
+
+
+def invalidate_model(model) -> None:
+    """
+    Invalidate the cached responses of every factory depending on the model.
+    Call it after writes that send no signal, such as bulk_create() and bulk_update().
+    """
+    for name, alias in _dependents.get(model, ()):
+        invalidate(name, alias)
+
+
+def _on_change(sender, **kwargs):
+    invalidate_model(sender)
+
+
+def _on_m2m_change(sender, instance, model, **kwargs):
+    if kwargs.get('action', '').startswith('pre_'):
+        return
+    invalidate_model(sender)
+    invalidate_model(instance.__class__)
+    invalidate_model(model)
+
+
+def connect_cache_invalidation(factory) -> None:
+    """
+    Invalidate the cached responses of the factory whenever its models change
+
+    :param factory: ModelFactory instance with cache options
+    """
+    options = get_cache_options(factory)
+    if options is None:
+        return
+    for model in get_dependent_models(factory):
+        _dependents.setdefault(model, set()).add((get_factory_name(factory), options['alias']))
+    post_save.connect(_on_change, weak=False, dispatch_uid='simplify_rest_framework.cache.post_save')
+    post_delete.connect(_on_change, weak=False, dispatch_uid='simplify_rest_framework.cache.post_delete')
+    m2m_changed.connect(_on_m2m_change, weak=False, dispatch_uid='simplify_rest_framework.cache.m2m_changed')
+
+
+def describe_option(value):
+    """
+    Process independent description of a factory option. Functions are named instead of using their address
+    and sets are sorted, so processes sharing a cache build the same keys.
+    """
+    if isinstance(value, (list, tuple)):
+        return [describe_option(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((describe_option(item) for item in value), key=repr)
+    if isinstance(value, dict):
+        return sorted(((key, describe_option(item)) for key, item in value.items()), key=repr)
+    if callable(value) and hasattr(value, '__qualname__'):
+        return f'{value.__module__}.{value.__qualname__}'
+    return repr(value)
+
+
+def is_request_scoped(factory) -> bool:
+    """
+    Whether the rows or fields of a response depend on request.user, so responses must be cached per user
+    """
+    permissions = get_compiled_permissions(factory.permission_classes)
+    return bool(factory.row_filter or factory.field_variants or factory.request_filters or
+                factory.get_plan().request_annotations or
+                any(hasattr(permission, 'filter_queryset') for permission in permissions))
+
+
+def get_cache_key(view, request, options) -> str:
+    """
+    Cache key of the request. It is computed once per request, when the response is looked up, so the key
+    of the stored response does not depend on fields narrowed while handling the request.
+    """
+    key = getattr(view, 'response_cache_key', None)
+    if key is not None:
+        return key
+    factory = view.factory
+    name = get_factory_name(factory)
+    cache = caches[options['alias']]
+    # Copies of a factory with other fields share its name
+    options_description = describe_option([
+        factory.fields, factory.excluded_fields, factory.annotated_fields, factory.serializer_depth,
+        factory.expandable_fields, factory.expanded_fields, factory.field_variants, factory.row_filter,
+        factory.request_filters])
+    parts = [view.action, sorted(view.kwargs.items()), request.accepted_media_type, options_description]
+    if factory.field_variants and view.action == 'list':
+        # Detail variants depend on the object, which is fetched after the lookup. The per user key covers them
+        parts.append(factory.get_field_variant(view, None))
+    if options['vary_on_user'] or is_request_scoped(factory):
+        parts.append(getattr(request.user, 'pk', None))
+    if options['vary_on_query_params']:
+        parts.append(sorted(request.query_params.lists()))
+    else:
+        # These parameters change the fields or rows of the response whatever vary_on_query_params says
+        parts.append(sorted((name, request.query_params.getlist(name))
+                            for name in (SPARSE_FIELDS_PARAM, SPARSE_OMIT_PARAM, EXPAND_PARAM)
+                            if name in request.query_params))
+        parts.append(sorted(get_active_filters(request, factory.request_filters)))
+    digest = md5(repr(parts).encode()).hexdigest()
+    view.response_cache_key = f'srf_cache:{name}:{cache.get(version_key(name), 0)}:{digest}'
+    return view.response_cache_key
+
+
+def is_html(request) -> bool:
+    """
+    Whether the response is rendered as HTML. Pages of the browsable API embed the user and a CSRF token,
+    so they are never cached
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and renderer.media_type.startswith('text/html')
+
+
+def get_cached_response(view, request) -> HttpResponse | None:
+    """
+    Return the cached rendered response of a list or retrieve action.
+    Hits skip object permission checks, so set vary_on_user when reads are restricted per user. Factories
+    with row_filter, field_variants, request_filters, request-aware annotations or permissions filtering
+    querysets are always cached per user.
+    """
+    options = get_cache_options(view.factory)
+    if options is None or view.action not in CACHED_ACTIONS or is_html(request):
+        return None
+    cached = caches[options['alias']].get(get_cache_key(view, request, options))
+    if cached is None:
+        return None
+    return HttpResponse(cached['content'], content_type=cached['content_type'], status=cached['status'])
+
+
+def cache_response(view, request, response) -> None:
+    """
+    Render and cache a successful list or retrieve response
+    """
+    options = get_cache_options(view.factory)
+    if options is None or view.action not in CACHED_ACTIONS or is_html(request):
+        return
+    if not isinstance(response, Response) or response.status_code != 200:
+        return
+    response.render()
+    cached = {'content': response.content, 'content_type': response['Content-Type'], 'status': response.status_code}
+    caches[options['alias']].set(get_cache_key(view, request, options), cached, options['timeout'])
@@ -0,0 +1,63 @@
+from hashlib import md5
+
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+CONDITIONAL_ACTIONS = ['list', 'retrieve']
+
+
+def get_conditional_queryset(view):
+    queryset = view.filter_queryset(view.get_queryset())
+    if view.action == 'retrieve':
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        queryset = queryset.filter(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+    return queryset
+
+
+def get_validators(view, request) -> tuple:
+    """
+    Compute the ETag and Last-Modified of a list or retrieve action with a single aggregate query
+
+    :return: (etag, last_modified datetime or None)
+    """
+    field = view.factory.conditional_field
+    state = get_conditional_queryset(view).order_by().aggregate(last_modified=Max(field), count=Count('pk'))
+    last_modified = state['last_modified']
+    parts = [view.factory.__class__.__name__, view.action, last_modified and last_modified.isoformat(),
+             state['count'], getattr(request.user, 'pk', None), sorted(request.query_params.lists()),
+             request.accepted_media_type]
+    return quote_etag(md5(repr(parts).encode()).hexdigest()), last_modified
+
+
+def is_not_modified(request, etag, last_modified) -> bool:
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        return '*' in etags or etag in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    if if_modified_since is not None and last_modified is not None:
+        return int(last_modified.timestamp()) <= if_modified_since
+    return False
+
+
+def get_not_modified_response(view, request):
+    """
+    Return 304 Not Modified when the client's copy is current. Stores the validators on the view so
+    finalize_response can add them to the full response.
+    """
+    if not view.factory.conditional_field or view.action not in CONDITIONAL_ACTIONS:
+        return None
+    etag, last_modified = get_validators(view, request)
+    view.conditional_validators = etag, last_modified
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+        set_validators(response, etag, last_modified)
+        return response
+    return None
+
+
+def set_validators(response, etag, last_modified) -> None:
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
@@ -0,0 +1,87 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+
+from .lru import LRUCache
+from .pagination import KeysetPagination
+
+# Converter tables keyed by (serializer class, annotation names). None marks serializers that need the regular path
+_fast_read_cache = LRUCache()
+
+# Fields whose to_representation returns database values unchanged
+IDENTITY_FIELDS = (drf_fields.BooleanField, drf_fields.CharField, drf_fields.FloatField, drf_fields.IntegerField)
+
+
+def compile_fast_read(serializer_class, model, annotations) -> tuple | None:
+    """
+    Compile the readable fields of a serializer into a converter table over values() rows
+
+    :param serializer_class: Serializer class of the factory
+    :param model: Model serialized
+    :param annotations: Annotation names of the queryset
+    :return: ((output name, values() key, converter or None), ...) or None when a field needs a model instance
+    """
+    table = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (BaseSerializer, drf_fields.FileField, drf_fields.SerializerMethodField)) or \
+                field.source != name:
+            return None
+        if name in annotations:
+            # Typed annotation fields render the annotated column
+            identity = type(field) in IDENTITY_FIELDS or type(field) == drf_fields.ReadOnlyField
+            table.append((name, name, None if identity else field.to_representation))
+            continue
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        if isinstance(field, PrimaryKeyRelatedField):
+            converter = field.pk_field.to_representation if field.pk_field is not None else None
+            table.append((name, model_field.attname, converter))
+        elif model_field.is_relation:
+            return None
+        elif type(field) in IDENTITY_FIELDS:
+            table.append((name, name, None))
+        else:
+            table.append((name, name, field.to_representation))
+    return tuple(table)
+
+
+def get_fast_read_table(serializer_class, model, annotations) -> tuple | None:
+    key = (serializer_class, frozenset(annotations))
+    return _fast_read_cache.get_or_create(key, lambda: compile_fast_read(serializer_class, model, annotations))
+
+
+def convert_row(row, table) -> dict:
+    return {name: row[key] if converter is None or row[key] is None else converter(row[key])
+            for name, key, converter in table}
+
+
+def fast_list(view) -> Response | None:
+    """
+    Serve the list action from values() rows converted by a precompiled table, skipping model instances and
+    serializer field objects. Returns None when a field needs the regular serializer.
+
+    :param view: View set instance
+    :return: Response or None
+    """
+    factory = view.factory
+    if factory.serializer_class or factory.serializer_depth or isinstance(view.paginator, KeysetPagination):
+        return None
+    queryset = view.filter_queryset(view.get_queryset())
+    if queryset._prefetch_related_lookups:
+        return None
+    table = get_fast_read_table(view.get_serializer_class(), factory.model, queryset.query.annotations)
+    if table is None:
+        return None
+    rows = queryset.values(*{key for _, key, _ in table})
+    page = view.paginate_queryset(rows)
+    if page is not None:
+        return view.get_paginated_response([convert_row(row, table) for row in page])
+    return Response([convert_row(row, table) for row in rows])
@@ -0,0 +1,69 @@
+from django.db.models import Q
+from django.utils.html import format_html, format_html_join
+from rest_framework.filters import BaseFilterBackend
+
+# Query parameter values that leave a request filter off
+FALSY_VALUES = ('', '0', 'false', 'False', 'off', 'no')
+
+
+def is_condition(value) -> bool:
+    return isinstance(value, Q) or getattr(value, 'conditional', False)
+
+
+def get_request_filters(factory) -> dict:
+    if type(factory.request_filters) != dict:
+        raise ValueError('request_filters must be a dict')
+    for name, value in factory.request_filters.items():
+        if not is_condition(value) and not callable(value):
+            raise ValueError(f'request filter {name} must be a Q, a boolean expression or a callable. '
+                             f'Your\'s {value}')
+    return factory.request_filters
+
+
+def get_active_filters(request, request_filters) -> list:
+    return [name for name in request_filters if request.query_params.get(name, '') not in FALSY_VALUES]
+
+
+def build_condition(value, request):
+    """
+    Q or boolean expression of a request filter, e.g. ~Exists(...) built from request.user
+    """
+    condition = value if is_condition(value) else value(request)
+    if not is_condition(condition):
+        raise ValueError(f'request filter must return a Q or a boolean expression. Your\'s {condition}')
+    return condition
+
+
+class RequestFilterBackend(BaseFilterBackend):
+    """
+    Apply the factory's request_filters toggled on by query parameters, e.g. ?unsolved_problems=1.
+    Conditions run inside the database on the planned queryset, so no id list is built in Python.
+    """
+    template_label = 'Request filters'
+
+    def filter_queryset(self, request, queryset, view):
+        request_filters = get_request_filters(view.factory)
+        for name in get_active_filters(request, request_filters):
+            queryset = queryset.filter(build_condition(request_filters[name], request))
+        return queryset
+
+    def to_html(self, request, queryset, view):
+        request_filters = get_request_filters(view.factory)
+        if not request_filters:
+            return ''
+        active = get_active_filters(request, request_filters)
+        checkboxes = format_html_join(
+            '', '<div class="checkbox"><label><input type="checkbox" name="{}" value="1"{}> {}</label></div>',
+            ((name, ' checked' if name in active else '', name) for name in request_filters))
+        return format_html('<h2>{}</h2><form class="form" action="" method="get">{}'
+                           '<button type="submit" class="btn btn-primary">Apply</button></form>',
+                           self.template_label, checkboxes)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': name,
+            'required': False,
+            'in': 'query',
+            'description': f'Set to 1 to apply the {name} filter',
+            'schema': {'type': 'boolean'},
+        } for name in view.factory.request_filters]
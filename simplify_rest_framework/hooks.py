@@ -0,0 +1,21 @@
+from asyncio import iscoroutinefunction
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+
+def call_hook(hook, *args):
+    """
+    Call a factory hook from synchronous code. Coroutine hooks run to completion on the event loop.
+    """
+    if iscoroutinefunction(hook):
+        return async_to_sync(hook)(*args)
+    return hook(*args)
+
+
+async def acall_hook(hook, *args):
+    """
+    Call a factory hook from asynchronous code. Synchronous hooks run in a worker thread as they may query.
+    """
+    if iscoroutinefunction(hook):
+        return await hook(*args)
+    return await sync_to_async(hook)(*args)
@@ -0,0 +1,238 @@
+from asyncio import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from time import perf_counter
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import connections
+
+ACTIONS = ['list', 'retrieve', 'create', 'update', 'partial_update', 'destroy']
+# Upper bounds of the histogram buckets. Times are in milliseconds
+TIME_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, float('inf'))
+METRICS = (('queries', QUERY_BUCKETS), ('sql_time', TIME_BUCKETS), ('serialization_time', TIME_BUCKETS),
+           ('total_time', TIME_BUCKETS))
+
+
+@dataclass
+class ActionMetrics:
+    """
+    Cost of a single view set action. Times are in seconds.
+    """
+    factory: str
+    action: str
+    queries: int = 0
+    sql_time: float = 0.0
+    serialization_time: float = 0.0
+    total_time: float = 0.0
+
+
+# Metrics of the action running in the current context. sync_to_async copies the context to its worker thread
+_current_metrics = ContextVar('srf_action_metrics', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Execute wrapper counting queries and the time spent running them into the metrics of the current context
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql_time += perf_counter() - start
+
+
+def install_query_counter() -> None:
+    """
+    Add count_query to the connections of the calling thread. Connections are per thread, so async actions
+    install it in the worker thread running their queries.
+    """
+    for connection in connections.all():
+        if count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(count_query)
+
+
+class ServerTimingSink:
+    """
+    Adds the metrics of the action to the Server-Timing response header
+    """
+
+    def __call__(self, metrics: ActionMetrics, request, response):
+        response['Server-Timing'] = ', '.join([
+            f'db;desc="{metrics.queries} queries";dur={metrics.sql_time * 1000:.2f}',
+            f'serialize;dur={metrics.serialization_time * 1000:.2f}',
+            f'total;dur={metrics.total_time * 1000:.2f}',
+        ])
+
+
+class HistogramSink:
+    """
+    Records the metrics into histograms stored in Django's cache framework.
+    Use a shared cache backend to read them from `manage.py srf_metrics` in another process.
+    """
+
+    def __init__(self, cache_alias='default', prefix='srf_metrics'):
+        self.cache_alias = cache_alias
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def __call__(self, metrics: ActionMetrics, request, response):
+        self.record(metrics)
+
+    def key(self, *parts):
+        return ':'.join([self.prefix, *[str(part) for part in parts]])
+
+    def record(self, metrics: ActionMetrics):
+        index = self.cache.get(self.key('index'), [])
+        if [metrics.factory, metrics.action] not in index:
+            self.cache.set(self.key('index'), [*index, [metrics.factory, metrics.action]], None)
+        for name, buckets in METRICS:
+            value = getattr(metrics, name) if name == 'queries' else getattr(metrics, name) * 1000
+            bucket = next(bound for bound in buckets if value <= bound)
+            self.increment(self.key(metrics.factory, metrics.action, name, bucket))
+        self.increment(self.key(metrics.factory, metrics.action, 'count'))
+
+    def increment(self, key):
+        if not self.cache.add(key, 1, None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, None)
+
+    def histograms(self) -> dict:
+        """
+        Return recorded histograms
+
+        :return: {(factory, action): {'count': int, metric: {bucket: count}}}
+        """
+        result = {}
+        for factory, action in self.cache.get(self.key('index'), []):
+            histogram = {'count': self.cache.get(self.key(factory, action, 'count'), 0)}
+            for name, buckets in METRICS:
+                histogram[name] = {bound: self.cache.get(self.key(factory, action, name, bound), 0)
+                                   for bound in buckets}
+            result[(factory, action)] = histogram
+        return result
+
+    def reset(self):
+        keys = [self.key('index')]
+        for factory, action in self.cache.get(self.key('index'), []):
+            keys.append(self.key(factory, action, 'count'))
+            for name, buckets in METRICS:
+                keys.extend(self.key(factory, action, name, bound) for bound in buckets)
+        self.cache.delete_many(keys)
+
+
+@contextmanager
+def measure_action(view, factory_name, action):
+    metrics = ActionMetrics(factory=factory_name, action=action)
+    view.action_metrics = metrics
+    start = perf_counter()
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+    metrics.total_time = perf_counter() - start
+
+
+def measure_stream(content, metrics: ActionMetrics, finish):
+    """
+    Keep measuring a streaming response while its content is consumed, then call finish().
+    Rows of streaming lists are fetched and serialized here, after the action returned.
+    """
+    iterator = iter(content)
+    try:
+        while True:
+            start = perf_counter()
+            token = _current_metrics.set(metrics)
+            try:
+                install_query_counter()
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_metrics.reset(token)
+                metrics.total_time += perf_counter() - start
+            yield chunk
+    finally:
+        finish()
+
+
+def instrument_action(method, factory_name, action, sinks):
+    if iscoroutinefunction(method):
+        @wraps(method)
+        async def instrumented_async(self, request, *args, **kwargs):
+            with measure_action(self, factory_name, action) as metrics:
+                # Thread sensitive sync_to_async calls of the request share this worker thread
+                await sync_to_async(install_query_counter)()
+                response = await method(self, request, *args, **kwargs)
+            for sink in sinks:
+                sink(metrics, request, response)
+            return response
+
+        return instrumented_async
+
+    @wraps(method)
+    def instrumented(self, request, *args, **kwargs):
+        with measure_action(self, factory_name, action) as metrics:
+            install_query_counter()
+            response = method(self, request, *args, **kwargs)
+
+        def finish():
+            for sink in sinks:
+                sink(metrics, request, response)
+
+        if getattr(response, 'streaming', False):
+            # Sinks run once the content is consumed, the headers are sent by then
+            response.streaming_content = measure_stream(response.streaming_content, metrics, finish)
+        else:
+            finish()
+        return response
+
+    return instrumented
+
+
+def instrument_view_set(view_set, factory_name, sinks):
+    """
+    Wrap the actions of a view set to record query count, SQL time, serialization time and total time
+
+    :param view_set: View set class
+    :param factory_name: Name reported in the metrics
+    :param sinks: Callables receiving (metrics, request, response)
+    :return: Instrumented view set class
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = view_set.get_serializer(self, *args, **kwargs)
+        metrics = getattr(self, 'action_metrics', None)
+        if metrics is not None:
+            to_representation = serializer.to_representation
+
+            def timed_to_representation(instance):
+                start, sql_start = perf_counter(), metrics.sql_time
+                try:
+                    return to_representation(instance)
+                finally:
+                    # Unpaginated querysets and prefetches are evaluated while serializing, their SQL time
+                    # is already counted in sql_time
+                    metrics.serialization_time += perf_counter() - start - (metrics.sql_time - sql_start)
+
+            serializer.to_representation = timed_to_representation
+        return serializer
+
+    actions = [*ACTIONS, 'bulk'] if hasattr(view_set, 'bulk') else ACTIONS
+    attrs = {action: instrument_action(getattr(view_set, action), factory_name, action, sinks) for action in actions}
+    attrs['get_serializer'] = get_serializer
+    attrs['action_metrics'] = None
+    return type(view_set.__name__, (view_set,), attrs)
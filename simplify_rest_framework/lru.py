@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from threading import RLock
+
+# Entries kept by each cache of compiled variants. Sparse fieldsets and ?expand= let clients request up to 2^n
+# field combinations, so rarely used ones are evicted
+MAX_CACHED_VARIANTS = 256
+
+
+class LRUCache:
+    """
+    Thread safe mapping keeping the most recently used entries
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_VARIANTS):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_or_create(self, key, create):
+        """
+        Return the entry of the key, calling create() to build it when missing
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+            value = create()
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+            return value
+
+    def remove(self, predicate=None) -> None:
+        """
+        Remove the entries whose key matches the predicate, or every entry if it is not passed
+        """
+        with self._lock:
+            if predicate is None:
+                self._items.clear()
+                return
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
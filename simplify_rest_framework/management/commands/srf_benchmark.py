@@ -0,0 +1,69 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from simplify_rest_framework import factories
+from simplify_rest_framework.testing import dummy_value, seed_instance
+from simplify_rest_framework.view_set import create_view_set
+
+
+def seed_rows(model, count, batch_size=1000) -> None:
+    """
+    Create count rows copied from one seeded row, with fresh values for unique fields
+    """
+    template = seed_instance(model)
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    rows = []
+    for _ in range(count - 1):
+        rows.append(model(**{field.attname: dummy_value(field) if field.unique else getattr(template, field.attname)
+                             for field in fields}))
+    model._default_manager.bulk_create(rows, batch_size=batch_size)
+
+
+def time_list(factory, fast_read, repeat) -> tuple:
+    """
+    Best time of rendering the unpaginated list endpoint
+
+    :return: (seconds, rendered content)
+    """
+    factory = factory.for_request(None)
+    factory.fast_read = fast_read
+    factory.pagination_class = None
+    factory.pagination_style = None
+    view = create_view_set(factory, metrics_sinks=[]).as_view({'get': 'list'})
+    best, content = None, None
+    for _ in range(repeat):
+        start = perf_counter()
+        response = view(APIRequestFactory().get('/'))
+        response.render()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        content = response.content
+    return best, content
+
+
+class Command(BaseCommand):
+    help = 'Compare the list endpoint of a factory with and without fast_read on seeded rows. Rows are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('factory', help='Registration key, e.g. TestCase.TestCaseFactory')
+        parser.add_argument('--rows', type=int, default=10000, help='Number of rows to seed')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs of each mode, the best one is reported')
+
+    def handle(self, *args, **options):
+        registered = factories._registered_model_factories
+        if options['factory'] not in registered:
+            raise CommandError(f'Unknown factory {options["factory"]}. Registered: {sorted(registered)}')
+        factory = registered[options['factory']]
+        with transaction.atomic():
+            seed_rows(factory.model, options['rows'])
+            serializer_time, expected = time_list(factory, False, options['repeat'])
+            fast_time, content = time_list(factory, True, options['repeat'])
+            transaction.set_rollback(True)
+        self.stdout.write(f'{options["factory"]}: {options["rows"]} seeded rows')
+        self.stdout.write(f'  serializer: {serializer_time * 1000:.1f}ms')
+        self.stdout.write(f'  fast_read: {fast_time * 1000:.1f}ms ({serializer_time / fast_time:.1f}x)')
+        if content != expected:
+            self.stdout.write(self.style.WARNING('  fast_read output differs from the serializer output'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from simplify_rest_framework.instrumentation import HistogramSink
+
+
+class Command(BaseCommand):
+    help = 'Print the per factory and action histograms recorded by HistogramSink'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cache', default='default', help='Cache alias used by the HistogramSink')
+        parser.add_argument('--prefix', default='srf_metrics', help='Key prefix used by the HistogramSink')
+        parser.add_argument('--reset', action='store_true', help='Delete the recorded histograms after printing')
+
+    def handle(self, *args, **options):
+        sink = HistogramSink(cache_alias=options['cache'], prefix=options['prefix'])
+        histograms = sink.histograms()
+        if not histograms:
+            self.stdout.write('No metrics recorded')
+        for (factory, action), histogram in histograms.items():
+            self.stdout.write(f'{factory} {action}: {histogram["count"]} requests')
+            for name, buckets in histogram.items():
+                if name == 'count':
+                    continue
+                unit = '' if name == 'queries' else 'ms'
+                counts = ', '.join(f'<={bound}{unit}: {count}' for bound, count in buckets.items() if count)
+                self.stdout.write(f'  {name}: {counts}')
+        if options['reset']:
+            sink.reset()
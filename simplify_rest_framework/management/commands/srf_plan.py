@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from simplify_rest_framework import factories
+from simplify_rest_framework.plan import describe_plan
+
+
+class Command(BaseCommand):
+    help = 'Print the columns, joins and prefetches chosen for each registered factory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('factories', nargs='*', help='Registration keys, e.g. Contest.ContestFactory. '
+                                                         'Defaults to every registered factory')
+
+    def handle(self, *args, **options):
+        registered = factories._registered_model_factories
+        unknown = set(options['factories']) - set(registered)
+        if unknown:
+            raise CommandError(f'Unknown factories {sorted(unknown)}. Registered: {sorted(registered)}')
+        for key in options['factories'] or registered:
+            report = describe_plan(registered[key])
+            self.stdout.write(key)
+            self.stdout.write(f'  only: {", ".join(report["only"]) or "-"}')
+            for join in report['select_related']:
+                self.stdout.write(f'  select_related: {join["lookup"]}{" (inferred)" if join["inferred"] else ""}')
+            for prefetch in report['prefetch_related']:
+                line = f'  prefetch_related: {prefetch["lookup"]}{" (inferred)" if prefetch["inferred"] else ""}'
+                if prefetch['only']:
+                    line += f' only: {", ".join(prefetch["only"])}'
+                if prefetch['select_related']:
+                    line += f' select_related: {", ".join(prefetch["select_related"])}'
+                self.stdout.write(line)
+            for name, expression in report['annotations'].items():
+                self.stdout.write(f'  annotate: {name} = {expression}')
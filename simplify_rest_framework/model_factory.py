@@ -1,32 +1,72 @@
-from copy import deepcopy
+from copy import copy
+from threading import Lock
 from typing import Type
 
-from django.db.models import QuerySet, Model, F
+from django.db.models import QuerySet, Model
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.fields import SerializerMethodField
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.serializers import ModelSerializer
 from rest_framework.settings import api_settings
-from rest_framework.utils import model_meta
 
-from .serializer import create_new_serializer, create_simple_serializer
+from .plan import FactoryPlan, get_plan
+from .serializer import get_cached_serializer, make_fingerprint
 
+SPARSE_FIELDS_PARAM = 'fields'
+SPARSE_OMIT_PARAM = 'omit'
+EXPAND_PARAM = 'expand'
+# Permission instances keyed by fingerprint of permission_classes
+_permission_cache = {}
+_permission_cache_lock = Lock()
 
-def method_for_relation(key, db_field, serializer, many=True):
-    def get_new_field(self, instance):
-        children = getattr(instance, db_field).all()
-        return serializer(children, many=many).data
 
-    get_new_field.__name__ = f'get_{key}'
-    return get_new_field
+def compile_permissions(permission_classes) -> tuple:
+    """
+    Validate permission specs and instantiate them
 
+    :param permission_classes: List of permission classes or {'class': PermissionClass, **kwargs} dicts
+    :return: tuple of permission instances
+    """
+    if permission_classes and type(permission_classes) != list:
+        raise ValueError('permission_classes must be a list')
+    permission_objs = []
+    for permission in permission_classes:
+        if type(permission) == dict:
+            if 'class' not in permission:
+                raise ValueError(f'permission dict must have a class. Your\'s {permission}')
+            kwargs = {key: value for key, value in permission.items() if key != 'class'}
+            permission_objs.append(permission['class'](**kwargs))
+        else:
+            permission_objs.append(permission())
+    return tuple(permission_objs)
 
-def method_for_field(key):
-    def get_new_field(self, instance):
-        return getattr(instance, key)
 
-    get_new_field.__name__ = f'get_{key}'
-    return get_new_field
+def get_compiled_permissions(permission_classes) -> tuple:
+    """
+    Return permission instances compiled once per permission_classes value.
+    Instances are shared by every request, so permissions must not keep per request state.
+    """
+    key = make_fingerprint(permission_classes)
+    permissions = _permission_cache.get(key)
+    if permissions is None:
+        with _permission_cache_lock:
+            permissions = _permission_cache.get(key)
+            if permissions is None:
+                permissions = compile_permissions(permission_classes)
+                _permission_cache[key] = permissions
+    return permissions
+
+
+def get_field_name(field) -> str:
+    """
+    Name a fields entry is serialized under, e.g. 'title' or ('problem_title', 'problem__title') -> 'problem_title'
+    """
+    return field[0] if type(field) == tuple else field
+
+
+def get_query_param_list(request, name) -> set:
+    return {value.strip() for value in request.query_params.get(name, '').split(',') if value.strip()}
 
 
 class ModelFactory:
@@ -37,27 +77,50 @@ class ModelFactory:
     def __init__(self):
         # For ModelViewSet
         self.annotated_fields: dict = {}
+        self.async_views: bool = False  # Generate an async view set for ASGI, hooks may be coroutines
         self.authentication_classes: list = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        # Cache list and retrieve responses. {'timeout': 60, 'vary_on_user': False, 'vary_on_query_params': True}
+        self.bulk_actions: list = []  # Expose bulk/ for ['create', 'update', 'delete']
+        self.cache: dict | None = None
+        self.conditional_field: str | None = None  # Timestamp field used for ETag / Last-Modified, e.g. 'updated_at'
         self.disabled_actions: list = []  # ['list', 'retrieve', 'create', 'update', 'partial_update', 'destroy']
         self.extra_field_to_query = set()
+        self.fast_read: bool = False  # Serve list from values() rows when every field is a plain column
         self.filterset_fields = []
         self.filter_backends: list = [DjangoFilterBackend, SearchFilter, OrderingFilter]
         self.get_object: callable = None
         self.http_method_names: list = ['get', 'post', 'put', 'patch', 'delete', 'head', 'options', 'trace']
         self.lookup_field = 'pk'
         self.lookup_url_kwarg = None
+        self.metrics_sinks: list = []  # Callables receiving query count and timings of each action
         self.pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+        self.pagination_style: str | None = None  # 'keyset' or 'countless' to use a built-in paginator
+        self.page_count_timeout: int | None = None  # Seconds 'countless' caches the total count, None omits it
+        self.page_size: int | None = None  # Page size of pagination_style
         self.permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
         self.prefetch_related = set()
         self.queryset: QuerySet | None = None
         self.renderer_classes: list = api_settings.DEFAULT_RENDERER_CLASSES
+        # Query parameter toggles, name -> Q, boolean expression or callable(request) returning one
+        self.request_filters: dict = {}
+        # Restrict rows to those owned by request.user. {'owner_fields': ['user'], 'unauthorized_readonly': False}
+        self.row_filter: dict | None = None
         self.search_fields: list = []
         self.select_related = set()
         self.serializer_class: Type[ModelSerializer] | None = None
+        self.sparse_fieldsets: bool = False  # Let read requests pick fields with ?fields=a,b or ?omit=c
+        self.streaming_list: bool = False  # Stream the list action as unpaginated JSON for large exports
+        self.streaming_chunk_size: int = 2000  # Rows fetched and serialized together when streaming
         # For ModelSerializer
         self.auto_user_field: str | None = None  # Which field to use for auto-populating the user
         self.create_instance: callable = None  # Which function to use for creating the model instance
         self.excluded_fields: list = []  # Which fields to exclude from the api
+        self.expandable_fields: list = []  # 3-tuple relation fields serialized as pks unless ?expand=name
+        self.expanded_fields: set = set()  # Expandable fields nested for the current request
+        self.default_field_variant: str | None = None  # field_variants key used when no other variant applies
+        self.field_variants: dict = {}  # Variant name -> fields, picked per request by get_field_variant
+        # Variant for owners of the object and for creates. {'variant': 'owner', 'owner_fields': ['user']}
+        self.owner_field_variant: dict | None = None
         self.extra_kwargs: dict = {}  # Extra kwargs to pass to the serializer
         self.extra_serializer_attrs: dict = {}
         self.fields: list = []  # Which fields to include in the api
@@ -67,117 +130,147 @@ class ModelFactory:
         self.write_only_fields: list = []  # Which fields to make write only
         # Others
         self.model: Type[Model] | None = None  # Which model to use
+        self.object: Model | None = None  # Object fetched by get_object for the current request
 
     def get_permissions(self, self2):
-        if self.permission_classes and type(self.permission_classes) != list:
-            raise ValueError('permission_classes must be a list')
-        permission_objs = []
-        # Avoid making changes in the original list
-        for permission in deepcopy(self.permission_classes):
-            if type(permission) == dict:
-                p = permission.get('class')
-                permission.pop('class')
-                permission_objs.append(p(**permission))
-            else:
-                permission_objs.append(permission())
-        return permission_objs
+        return list(get_compiled_permissions(self.permission_classes))
 
     def get_extra_kwargs(self):
         if self.extra_kwargs and type(self.extra_kwargs) != dict:
             raise ValueError('extra_kwargs must be a dict')
+        extra_kwargs = dict(self.extra_kwargs)
         for field in self.write_only_fields:
-            if field in self.extra_kwargs:
-                field_extra = {**self.extra_kwargs[field], 'write_only': True}
-                self.extra_kwargs[field] = field_extra
-            else:
-                self.extra_kwargs[field] = {'write_only': True}
-        return self.extra_kwargs
+            extra_kwargs[field] = {**extra_kwargs.get(field, {}), 'write_only': True}
+        return extra_kwargs
+
+    def for_request(self, self2):
+        """
+        Return a copy of the factory scoped to a single request. Overrides may assign or mutate its attributes
+        without leaking into concurrent requests.
+
+        :param self2: View set instance handling the request
+        :return: ModelFactory
+        """
+        factory = copy(self)
+        for name, value in vars(self).items():
+            if isinstance(value, (list, dict, set)):
+                setattr(factory, name, copy(value))
+        return factory
+
+    def get_plan(self) -> FactoryPlan:
+        return get_plan(self)
+
+    def get_annotations(self, request) -> dict:
+        """
+        Annotations of the plan, with request-aware expressions built for the request
+        """
+        plan = self.get_plan()
+        if not plan.request_annotations:
+            return dict(plan.annotations)
+        return {**plan.annotations, **{name: build(request) for name, build in plan.request_annotations.items()}}
 
     def get_fields(self):
-        # Validate required attributes
-        if model_meta.is_abstract_model(self.model):
-            raise ValueError('Abstract model can not be used')
-        if self.fields and self.excluded_fields:
-            raise ValueError('fields and excluded fields can not be same time')
-        if self.fields and type(self.fields) != list:
-            raise ValueError(f'fields must be a list. currently {type(self.fields)}')
-        if self.excluded_fields and type(self.excluded_fields) != list:
-            raise ValueError('excluded_fields must be a list')
-        # Return fields name
-        all_fields = model_meta.get_field_info(self.model)
-        fields = list(all_fields.fields.keys())
-        relations = [(field, info.related_model, info.to_many, info.reverse) for field, info in
-                     all_fields.relations.items()]
-        fields = [*fields, *[field for field, _, _, reverse in relations if not reverse]]
-        if hasattr(deepcopy(self.model)(), 'id'):  # include **id** if id is primary key
-            fields.append('id')
-        if self.fields:
-            tem_fields = deepcopy(self.fields)
-            for field in self.fields:
-                if type(field) == str:
-                    if field not in fields:
-                        raise ValueError('field {} not found in model {}'.format(field, self.model))
-                elif type(field) == tuple and len(field) == 2:
-                    self.extra_serializer_attrs[field[0]] = SerializerMethodField()
-                    self.extra_serializer_attrs[f'get_{field[0]}'] = method_for_field(field[0])
-                    self.annotated_fields[field[0]] = F(field[1])
-                    tem_fields.remove(field)
-                    tem_fields.append(field[0])
-                elif type(field) == tuple and len(field) == 3:
-                    if field[1] in [qvg for qvg, _, _, _ in relations]:
-                        for fn, model, many, reverse in relations:
-                            if field[1] == fn:
-                                break
-                        serializer = create_simple_serializer(model, field[2])
-                        self.extra_serializer_attrs[field[0]] = SerializerMethodField()
-                        self.extra_serializer_attrs[f'get_{field[0]}'] = method_for_relation(
-                            field[0], field[1], serializer, many)
-                        tem_fields.append(field[0])
-                        tem_fields.remove(field)
-                        if many:
-                            self.prefetch_related.add(field[1])
-                        else:
-                            self.select_related.add(field[1])
-                    else:
-                        tem_fields.remove(field)
-                elif type(field) == tuple and (len(field) == 4 or len(field) == 5):
-                    self.extra_serializer_attrs[field[0]] = SerializerMethodField()
-                    self.extra_serializer_attrs[f'get_{field[0]}'] = field[3]
-                    for inr in field[1]:
-                        self.extra_field_to_query.add(inr)
-                    for inr in field[2]:
-                        self.prefetch_related.add(inr)
-                    if len(field) == 5:
-                        for inr in field[4]:
-                            self.select_related.add(inr)
-                else:
-                    raise ValueError(f'field must be a string or tuple. Your\'s {field}')
-            return tem_fields
-        if self.excluded_fields:
-            fields = [field for field in fields if field not in self.excluded_fields]
-        return fields
+        return list(self.get_plan().fields)
 
     def get_fields_to_query(self):
-        all_fields = model_meta.get_field_info(self.model)
-        fields = list(all_fields.fields.keys())
-        fields = [*fields, *[field for field, info in all_fields.relations.items() if not info.reverse]]
-        fields_to_query = set()
-        for field in self.extra_field_to_query:
-            fields_to_query.add(field)
-        for field in self.fields:
-            if type(field) == str:
-                fields_to_query.add(field)
-            elif type(field) == tuple and (len(field) == 2 or len(field) == 3):
-                if field[1] in fields:
-                    fields_to_query.add(field[1])
-            elif type(field) == tuple and (len(field) == 4 or len(field) == 5):
-                for qqq in field[1]:
-                    fields_to_query.add(qqq)
-        return fields_to_query
+        return set(self.get_plan().fields_to_query)
 
     def validate(self, self2, attrs):
         return attrs
 
+    def get_owner_field_variant(self) -> tuple:
+        """
+        :return: (variant name, owner fields) or (None, []) when owner_field_variant is not set
+        """
+        if not self.owner_field_variant:
+            return None, []
+        if type(self.owner_field_variant) != dict or 'variant' not in self.owner_field_variant:
+            raise ValueError(f'owner_field_variant must be a dict with a variant. Your\'s {self.owner_field_variant}')
+        unknown = set(self.owner_field_variant) - {'variant', 'owner_fields'}
+        if unknown:
+            raise ValueError(f'Unknown owner_field_variant options {unknown}')
+        return self.owner_field_variant['variant'], self.owner_field_variant.get('owner_fields', ['user'])
+
+    def get_field_variant(self, self2, obj) -> str:
+        """
+        Name of the field variant serializing the request. Override to pick variants on other rules.
+        The owner variant applies to owners of the object and to writes without an object, since the creator
+        owns the new row. Ownership through a foreign key is checked without a query.
+
+        :param self2: View set instance
+        :param obj: Object fetched by get_object, None for list and create
+        :return: Key of field_variants
+        """
+        variant, owner_fields = self.get_owner_field_variant()
+        request = getattr(self2, 'request', None)
+        if variant is None or request is None:
+            return self.default_field_variant
+        if obj is None:
+            return variant if request.method not in SAFE_METHODS else self.default_field_variant
+        from .permissions import is_owner  # Needs the user model, which is not ready at import time
+
+        return variant if is_owner(obj, owner_fields, request.user) else self.default_field_variant
+
+    def apply_field_variant(self, self2) -> None:
+        """
+        Set fields to the variant of the request. Detail actions query the union of every variant's fields
+        before the object is fetched, so choosing the variant afterwards needs no extra query.
+        Each variant gets its own cached plan and serializer.
+        """
+        if not self.field_variants:
+            return
+        if type(self.field_variants) != dict:
+            raise ValueError('field_variants must be a dict')
+        lookup_url_kwarg = getattr(self2, 'lookup_url_kwarg', None) or getattr(self2, 'lookup_field', 'pk')
+        if self.object is None and lookup_url_kwarg in (getattr(self2, 'kwargs', None) or {}):
+            fields = {}
+            for variant in self.field_variants.values():
+                for field in variant:
+                    fields.setdefault(get_field_name(field), field)
+            self.fields = list(fields.values())
+            if self.owner_field_variant:
+                from .permissions import split_owner_fields
+
+                # Foreign key owner fields are loaded for get_field_variant even when no variant serializes them
+                self.extra_field_to_query = {*self.extra_field_to_query,
+                                             *split_owner_fields(self.model, self.get_owner_field_variant()[1])[0]}
+            return
+        variant = self.get_field_variant(self2, self.object)
+        if variant not in self.field_variants:
+            raise ValueError(f'Unknown field variant {variant}. Choose one of {list(self.field_variants)}')
+        self.fields = list(self.field_variants[variant])
+
+    def apply_sparse_fieldset(self, self2) -> None:
+        """
+        Narrow fields to the ?fields= / ?omit= query parameters of a read request. The narrowed fields get their
+        own cached plan and serializer, so the queryset only loads the columns and relations still serialized.
+        """
+        request = getattr(self2, 'request', None)
+        # A custom serializer_class keeps its own fields, so its columns must not be narrowed
+        if not self.sparse_fieldsets or self.serializer_class or request is None or request.method not in SAFE_METHODS:
+            return
+        requested = get_query_param_list(request, SPARSE_FIELDS_PARAM)
+        omitted = get_query_param_list(request, SPARSE_OMIT_PARAM)
+        if not requested and not omitted:
+            return
+        fields = self.fields or list(self.get_plan().fields)
+        # Names outside the factory's fields are ignored
+        fields = [field for field in fields if (not requested or get_field_name(field) in requested) and
+                  get_field_name(field) not in omitted]
+        if not fields:
+            raise ValidationError({SPARSE_FIELDS_PARAM: 'No field left to serialize'})
+        self.fields = fields
+        self.excluded_fields = []
+
+    def apply_expand(self, self2) -> None:
+        """
+        Nest the expandable fields listed in the ?expand= query parameter
+        """
+        request = getattr(self2, 'request', None)
+        if not self.expandable_fields or self.serializer_class or request is None:
+            return
+        self.expanded_fields = get_query_param_list(request, EXPAND_PARAM) & set(self.expandable_fields)
+
     def get_serializer_class(self, self2) -> Type[ModelSerializer]:
         super_self = self
         if self.serializer_class and not issubclass(self.serializer_class, ModelSerializer):
@@ -185,14 +278,41 @@ class ModelFactory:
 
         if self.serializer_class:
             return self.serializer_class
-        return create_new_serializer(super_self, self.extra_serializer_attrs)
+        self.apply_field_variant(self2)
+        self.apply_sparse_fieldset(self2)
+        self.apply_expand(self2)
+        return get_cached_serializer(super_self, dict(self.get_plan().serializer_attrs))
 
     def get_queryset(self, self2) -> QuerySet:
         if self.queryset and type(self.queryset) != QuerySet:
             raise ValueError('queryset must be queryset')
-        self.get_fields()
-        fields = self.get_fields_to_query()
+        self.apply_field_variant(self2)
+        self.apply_sparse_fieldset(self2)
+        self.apply_expand(self2)
+        plan = self.get_plan()
         queryset = self.queryset or self.model.objects
-        queryset = queryset.annotate(**self.annotated_fields).prefetch_related(*self.prefetch_related).select_related(
-            *self.select_related).only(*fields)
+        queryset = queryset.annotate(**self.get_annotations(getattr(self2, 'request', None)))
+        queryset = queryset.prefetch_related(*plan.prefetch_related)
+        if plan.select_related:
+            # select_related() without arguments would join every foreign key
+            queryset = queryset.select_related(*plan.select_related)
+        queryset = queryset.only(*plan.fields_to_query)
         return queryset.all()
+
+    def filter_rows(self, self2, queryset) -> QuerySet:
+        """
+        Apply row_filter to the queryset of any action. Object lookups go through the same queryset,
+        so rows outside the filter are not found instead of being checked one by one in Python.
+        """
+        if not self.row_filter:
+            return queryset
+        if type(self.row_filter) != dict:
+            raise ValueError('row_filter must be a dict')
+        unknown = set(self.row_filter) - {'owner_fields', 'unauthorized_readonly'}
+        if unknown:
+            raise ValueError(f'Unknown row_filter options {unknown}')
+        from .permissions import filter_owned  # Needs the user model, which is not ready at import time
+
+        if self.row_filter.get('unauthorized_readonly') and self2.request.method in SAFE_METHODS:
+            return queryset
+        return filter_owned(queryset, self.row_filter.get('owner_fields', ['user']), self2.request.user)
@@ -0,0 +1,279 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from hashlib import md5
+
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def get_order_field(model, name: str):
+    """
+    Model field of an ordering term such as '-created_at', or None if it is not a direct field
+    """
+    name = name.lstrip('-')
+    if name == 'pk':
+        return model._meta.pk
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def is_indexable(model, name: str) -> bool:
+    """
+    Whether ordering by the term can be served by an index
+    """
+    field = get_order_field(model, name)
+    if field is None or not field.concrete:
+        return False
+    if field.primary_key or field.unique or field.db_index or field.is_relation:
+        return True
+    # The model's default ordering is trusted to be indexed
+    if name.lstrip('-') in [term.lstrip('-') for term in model._meta.ordering if isinstance(term, str)]:
+        return True
+    return any(index.fields and index.fields[0].lstrip('-') == field.name for index in model._meta.indexes)
+
+
+class SizedPagination(BasePagination):
+    """
+    Page size handling shared by the built-in paginators
+    """
+    page_size = api_settings.PAGE_SIZE or 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_page_size_schema_parameter(self):
+        return {
+            'name': self.page_size_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Number of results to return per page.',
+            'schema': {'type': 'integer'},
+        }
+
+
+class KeysetPagination(SizedPagination):
+    """
+    Forward only keyset (cursor) pagination. The cursor holds the ordering values of the last row of the page,
+    so every page costs O(page size) no matter how deep it is.
+
+    Ordering comes from OrderingFilter when every term is indexable, otherwise from the model's Meta.ordering.
+    The primary key is always appended as a unique tiebreaker. Ordering fields are expected to be non-null.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, queryset) -> list:
+        model = queryset.model
+        ordering = [term for term in queryset.query.order_by if isinstance(term, str)]
+        if not ordering or not all(is_indexable(model, term) for term in ordering):
+            ordering = [term for term in model._meta.ordering if isinstance(term, str) and is_indexable(model, term)]
+        names = [get_order_field(model, term).name for term in ordering]
+        if model._meta.pk.name not in names:
+            ordering.append('pk')
+        return ordering
+
+    def encode_cursor(self, instance, ordering) -> str:
+        values = [getattr(instance, get_order_field(instance.__class__, term).attname) for term in ordering]
+        # str() keeps the full precision of datetimes and decimals, to_python parses them back
+        values = [value if value is None or isinstance(value, (bool, int, float, str)) else str(value)
+                  for value in values]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request, model, ordering) -> list | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+            if type(values) != list or len(values) != len(ordering):
+                raise ValueError
+            return [get_order_field(model, term).to_python(value) for term, value in zip(ordering, values)]
+        except (BinasciiError, TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_keyset_filter(self, model, ordering, values) -> Q:
+        """
+        Rows after the cursor: (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        for position, term in enumerate(ordering):
+            attname = get_order_field(model, term).attname
+            lookup = 'lt' if term.startswith('-') else 'gt'
+            equal = {get_order_field(model, previous).attname: value
+                     for previous, value in zip(ordering[:position], values[:position])}
+            condition |= Q(**equal, **{f'{attname}__{lookup}': values[position]})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = self.get_ordering(queryset)
+        # Foreign keys are ordered by their column, as the cursor compares it. order_by('problem') would sort by
+        # the related model's Meta.ordering instead
+        queryset = queryset.order_by(*[f'{"-" if term.startswith("-") else ""}'
+                                       f'{get_order_field(queryset.model, term).attname}' for term in ordering])
+        values = self.decode_cursor(request, queryset.model, ordering)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(queryset.model, ordering, values))
+        rows = list(queryset[:self.page_size + 1])
+        self.next_cursor = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_cursor = self.encode_cursor(rows[-1], ordering)
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            self.get_page_size_schema_parameter(),
+        ]
+
+
+class CountlessPagination(SizedPagination):
+    """
+    Page number pagination without COUNT(*). page_size + 1 rows are fetched to know whether a next page exists.
+
+    Set count_timeout to add the total count. It is cached per filtered queryset for that many seconds,
+    so the count runs at most once per filter combination and timeout.
+    """
+    page_query_param = 'page'
+    count_timeout: int | None = None
+    count_cache_alias = 'default'
+    invalid_page_message = 'Invalid page'
+
+    def get_page_number(self, request) -> int:
+        try:
+            page = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        if page < 1:
+            raise NotFound(self.invalid_page_message)
+        return page
+
+    def get_count(self, queryset) -> int:
+        try:
+            sql, params = queryset.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = f'srf_count:{md5(repr((queryset.db, sql, params)).encode()).hexdigest()}'
+        cache = caches[self.count_cache_alias]
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.count_timeout)
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.page = self.get_page_number(request)
+        offset = (self.page - 1) * self.page_size
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.count = self.get_count(queryset) if self.count_timeout else None
+        return rows[:self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page + 1)
+
+    def get_previous_link(self):
+        if self.page == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page - 1)
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.page_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'A page number within the paginated result set.',
+                'schema': {'type': 'integer'},
+            },
+            self.get_page_size_schema_parameter(),
+        ]
+
+
+PAGINATION_STYLES = {
+    'countless': CountlessPagination,
+    'keyset': KeysetPagination,
+}
+
+
+def get_pagination_class(factory):
+    """
+    Pagination class of the generated view set
+
+    :param factory: ModelFactory instance
+    :return: Pagination class
+    """
+    if factory.pagination_style is None:
+        return factory.pagination_class
+    if factory.pagination_style not in PAGINATION_STYLES:
+        raise ValueError(f'pagination_style must be one of {list(PAGINATION_STYLES)}')
+    pagination_class = PAGINATION_STYLES[factory.pagination_style]
+    attrs = {'page_size': factory.page_size or pagination_class.page_size}
+    if issubclass(pagination_class, CountlessPagination):
+        attrs['count_timeout'] = factory.page_count_timeout
+    return type(f'{factory.model.__name__}{pagination_class.__name__}', (pagination_class,), attrs)
@@ -1,9 +1,89 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
 from rest_framework import permissions
 
 User = get_user_model()
 
 
+def split_owner_fields(model, owner_fields) -> tuple:
+    """
+    Split owner fields into single valued relations (checked in Python) and to-many relations (checked in SQL).
+    Fields that are not relations to the user model are returned as attributes.
+
+    :return: (single valued field names, to-many field names, other attribute names)
+    """
+    single, to_many, attributes = [], [], []
+    for field in owner_fields:
+        try:
+            model_field = model._meta.get_field(field)
+        except FieldDoesNotExist:
+            attributes.append(field)
+            continue
+        if not model_field.is_relation or not issubclass(model_field.related_model, User):
+            continue
+        if model_field.many_to_many or model_field.one_to_many:
+            to_many.append(field)
+        else:
+            single.append(field)
+    return single, to_many, attributes
+
+
+def get_owner_q(model, owner_fields, user) -> Q:
+    """
+    Q object matching the rows of the model owned by the user through any owner field.
+    To-many owner fields go through a pk subquery so rows are never duplicated.
+
+    :param model: Subclass of django.db.models.Model
+    :param owner_fields: Field names pointing to the user model, e.g. ['user', 'writers']
+    :param user: request.user
+    :return: Q
+    """
+    if not user or not user.is_authenticated:
+        return Q(pk__in=[])
+    single, to_many, _ = split_owner_fields(model, owner_fields)
+    q = Q()
+    for field in single:
+        q |= Q(**{field: user.pk})
+    if to_many:
+        owned = Q()
+        for field in to_many:
+            owned |= Q(**{field: user.pk})
+        q |= Q(pk__in=model._default_manager.filter(owned).values('pk'))
+    return q if q else Q(pk__in=[])
+
+
+def filter_owned(queryset, owner_fields, user):
+    """
+    Filter a queryset to the rows owned by the user. Superusers see every row.
+    """
+    if getattr(user, 'is_superuser', False):
+        return queryset
+    return queryset.filter(get_owner_q(queryset.model, owner_fields, user))
+
+
+def is_owner(obj, owner_fields, user) -> bool:
+    """
+    Whether the user owns the object. Foreign keys are compared without a query,
+    to-many owner fields are checked with a single EXISTS query.
+    """
+    if not user or not user.is_authenticated:
+        return False
+    single, to_many, attributes = split_owner_fields(obj.__class__, owner_fields)
+    for field in single:
+        if getattr(obj, obj._meta.get_field(field).attname) == user.pk:
+            return True
+    for field in attributes:
+        if getattr(obj, field, None) == user:
+            return True
+    if to_many:
+        owned = Q()
+        for field in to_many:
+            owned |= Q(**{field: user.pk})
+        return obj.__class__._default_manager.filter(owned, pk=obj.pk).exists()
+    return False
+
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
     Object-level permission to only allow owners of an object to edit it.
@@ -19,18 +99,15 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if self.unauthorized_readonly and request.method in permissions.SAFE_METHODS:
             return True
-        owners = []
-        for field in self.owner_fields:
-            owner_field_value = getattr(obj, field, None)
-            if owner_field_value and hasattr(owner_field_value, 'all'):
-                field_owners = owner_field_value.all()
-            elif owner_field_value:
-                field_owners = [owner_field_value]
-            else:
-                continue
-            if field_owners and isinstance(field_owners[0], User):
-                owners.extend(field_owners)
-        return request.user in owners or getattr(request.user, 'is_superuser', False)
+        return getattr(request.user, 'is_superuser', False) or is_owner(obj, self.owner_fields, request.user)
+
+    def filter_queryset(self, request, queryset, view=None):
+        """
+        Queryset-level counterpart of has_object_permission. Generated view sets apply it to list actions
+        """
+        if self.unauthorized_readonly and request.method in permissions.SAFE_METHODS:
+            return queryset
+        return filter_owned(queryset, self.owner_fields, request.user)
 
 
 class IsOwner(IsOwnerOrReadOnly):
@@ -50,9 +127,9 @@ class HasContestOrReadOnly(permissions.BasePermission):
                     (request.user and request.user.is_staff))
 
     def has_object_permission(self, request, view, obj, safe_deny=False):
-        related_users = [user.id for user in obj.writers.all()]
         if request.method in ['PUT', 'PATCH'] or safe_deny:
-            return bool(request.user and (request.user.is_staff or request.user.id in related_users))
+            return bool(request.user and (request.user.is_staff or
+                                          obj.writers.filter(pk=request.user.pk).exists()))
         if request.method in permissions.SAFE_METHODS:
             return True
         return False
@@ -0,0 +1,411 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db.models import F, Prefetch
+from rest_framework.fields import ReadOnlyField, SerializerMethodField
+from rest_framework.serializers import ModelSerializer
+from rest_framework.utils import model_meta
+
+from .lru import LRUCache
+from .serializer import create_simple_serializer, make_fingerprint
+
+# Serializer field kwargs that affect how an annotation is rendered
+ANNOTATION_FIELD_KWARGS = ('choices', 'decimal_places', 'max_digits')
+# Plans keyed by (factory class, model, fingerprint of the plan options)
+_plan_cache = LRUCache()
+
+
+def method_for_relation(key, db_field, serializer, many=True):
+    def get_new_field(self, instance):
+        batched = getattr(self, '_batched_relations', None) or {}
+        if id(instance) in batched.get(key, {}):
+            return batched[key][id(instance)]
+        return serialize_relation([instance])[id(instance)]
+
+    def serialize_relation(instances):
+        # Serialize the children of every instance with a single nested serializer
+        if many:
+            groups = [list(getattr(instance, db_field).all()) for instance in instances]
+            data = serializer([child for group in groups for child in group], many=True).data
+            result, start = {}, 0
+            for instance, group in zip(instances, groups):
+                result[id(instance)] = data[start:start + len(group)]
+                start += len(group)
+            return result
+        children = [getattr(instance, db_field) for instance in instances]
+        data = iter(serializer([child for child in children if child is not None], many=True).data)
+        return {id(instance): next(data) if child is not None else None
+                for instance, child in zip(instances, children)}
+
+    get_new_field.__name__ = f'get_{key}'
+    get_new_field.serialize_relation = serialize_relation
+    return get_new_field
+
+
+def get_relation_columns(model, relation, fields):
+    """
+    Columns of the related model needed to serialize a relation field
+
+    :param model: Model owning the relation
+    :param relation: Relation name
+    :param fields: Fields of the related model to serialize
+    :return: set of column names
+    """
+    related_model = model_meta.get_field_info(model).relations[relation].related_model
+    concrete_fields = {field.name for field in related_model._meta.concrete_fields}
+    columns = {related_model._meta.pk.name, *[field for field in fields if field in concrete_fields]}
+    for related_object in model._meta.related_objects:
+        if related_object.get_accessor_name() == relation and not related_object.many_to_many:
+            # Reverse foreign key needs the column pointing back to match children with parents
+            columns.add(related_object.field.name)
+    return columns
+
+
+def get_nested_field_names(model) -> list:
+    """
+    Fields rendered by the nested serializer ModelSerializer builds for serializer_depth
+    """
+    info = model_meta.get_field_info(model)
+    return [info.pk.name, *info.fields, *info.forward_relations]
+
+
+def infer_relations(model, names, depth, prefix='', relations=None) -> tuple:
+    """
+    Infer the columns and joins needed to serialize fields of a model. Forward foreign keys are joined with
+    select_related while depth remains, otherwise only their column is read. Many to many relations are
+    prefetched with the columns of the related model their serializer reads.
+
+    :param model: Model serializing the fields
+    :param names: Field names of the model
+    :param depth: Remaining serializer depth
+    :param prefix: Lookup from the queried model to this model, e.g. 'problem__'
+    :param relations: Prefetch lookup -> {'model', 'columns', 'select_related'}, updated in place
+    :return: (set of column lookups, set of select_related lookups)
+    """
+    relations = {} if relations is None else relations
+    columns, joins = {f'{prefix}{model._meta.pk.name}'} if prefix else set(), set()
+    for name in names:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and not field.many_to_many:
+            columns.add(f'{prefix}{name}')
+            if field.is_relation and depth > 0:
+                joins.add(f'{prefix}{name}')
+                nested_columns, nested_joins = infer_relations(
+                    field.related_model, get_nested_field_names(field.related_model), depth - 1,
+                    f'{prefix}{name}__', relations)
+                columns.update(nested_columns)
+                joins.update(nested_joins)
+        elif field.many_to_many and not field.auto_created:
+            lookup = f'{prefix}{name}'
+            relation = relations.setdefault(lookup, {'model': field.related_model, 'columns': set(),
+                                                     'select_related': set()})
+            relation['columns'].add(field.related_model._meta.pk.name)
+            if depth > 0:
+                # Relations of the prefetched model are relative to it, nested prefetches keep the full lookup
+                nested = {}
+                nested_columns, nested_joins = infer_relations(
+                    field.related_model, get_nested_field_names(field.related_model), depth - 1, '', nested)
+                relation['columns'].update(nested_columns)
+                relation['select_related'].update(nested_joins)
+                for nested_lookup, nested_relation in nested.items():
+                    relations[f'{lookup}__{nested_lookup}'] = nested_relation
+    return columns, joins
+
+
+def get_lookup(prefetch) -> str:
+    return prefetch.prefetch_to if isinstance(prefetch, Prefetch) else prefetch
+
+
+def method_for_relation_pk(key, db_field, many=True, attname=None):
+    """
+    Getter serializing an unexpanded relation as its primary key(s)
+
+    :param attname: Column of a forward foreign key, read without a query
+    """
+    def get_new_field(self, instance):
+        if many:
+            return [child.pk for child in getattr(instance, db_field).all()]
+        if attname:
+            return getattr(instance, attname)
+        child = getattr(instance, db_field, None)
+        return child.pk if child is not None else None
+
+    get_new_field.__name__ = f'get_{key}'
+    return get_new_field
+
+
+def get_lookup_field(model, lookup):
+    """
+    Model field holding the value of a lookup such as 'problem__title'. Relations resolve to the related
+    primary key, which is what F() returns for them. None when the lookup does not end in a field.
+    """
+    field = None
+    for part in lookup.split('__'):
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model if field.is_relation else None
+    if field is not None and field.is_relation:
+        return field.related_model._meta.pk if field.related_model is not None else None
+    return field
+
+
+def get_expression_field(model, name, expression):
+    """
+    Output model field of an expression such as Count('submission') or Exists(...), resolved without a query
+    """
+    try:
+        return model._default_manager.annotate(**{name: expression}).query.annotations[name].output_field
+    except (AttributeError, FieldError, TypeError, ValueError):
+        return None
+
+
+def is_expression(value) -> bool:
+    return hasattr(value, 'resolve_expression')
+
+
+def build_annotation_field(model, name, value):
+    """
+    Typed read-only serializer field for an annotation, e.g. CharField for F('problem__title')
+    or IntegerField for Count('submission'). Untyped values fall back to ReadOnlyField.
+
+    :param value: Lookup, expression or callable(request) returning an expression
+    """
+    if type(value) == str:
+        model_field = get_lookup_field(model, value)
+    elif is_expression(value):
+        model_field = get_expression_field(model, name, value)
+    else:
+        model_field = None
+    if model_field is None:
+        return ReadOnlyField()
+    field_class, kwargs = ModelSerializer().build_standard_field(model_field.name, model_field)
+    return field_class(read_only=True, **{key: value for key, value in kwargs.items()
+                                          if key in ANNOTATION_FIELD_KWARGS})
+
+
+@dataclass(frozen=True)
+class FactoryPlan:
+    """
+    Resolved configuration of a ModelFactory. Compiled once per fields variant and only read afterwards.
+    """
+    fields: tuple  # Field names passed to the serializer
+    fields_to_query: frozenset  # Columns passed to only()
+    annotations: MappingProxyType  # Annotation name -> expression
+    request_annotations: MappingProxyType  # Annotation name -> callable(request) returning an expression
+    select_related: frozenset
+    prefetch_related: tuple  # Lookups and Prefetch objects, parents first
+    serializer_attrs: MappingProxyType  # Method fields and their getters
+
+
+def get_plan_fingerprint(factory):
+    return make_fingerprint((factory.fields, factory.excluded_fields, factory.annotated_fields,
+                             factory.extra_field_to_query, factory.extra_serializer_attrs,
+                             factory.prefetch_related, factory.select_related, factory.serializer_depth,
+                             factory.expandable_fields, factory.expanded_fields))
+
+
+def compile_plan(factory) -> FactoryPlan:
+    """
+    Resolve fields, columns, annotations, joins and method fields of a factory
+
+    :param factory: ModelFactory instance
+    :return: FactoryPlan
+    """
+    model = factory.model
+    # Validate required attributes
+    if model_meta.is_abstract_model(model):
+        raise ValueError('Abstract model can not be used')
+    if factory.fields and factory.excluded_fields:
+        raise ValueError('fields and excluded fields can not be same time')
+    if factory.fields and type(factory.fields) != list:
+        raise ValueError(f'fields must be a list. currently {type(factory.fields)}')
+    if factory.excluded_fields and type(factory.excluded_fields) != list:
+        raise ValueError('excluded_fields must be a list')
+    if type(factory.expandable_fields) != list:
+        raise ValueError('expandable_fields must be a list')
+
+    all_fields = model_meta.get_field_info(model)
+    model_fields = list(all_fields.fields.keys())
+    relations = {field: info for field, info in all_fields.relations.items()}
+    model_fields = [*model_fields, *[field for field, info in relations.items() if not info.reverse]]
+    if hasattr(model, 'id'):  # include **id** if id is primary key
+        model_fields.append('id')
+
+    annotations = dict(factory.annotated_fields)
+    request_annotations = {}  # Annotation name -> callable(request) returning the expression
+    serializer_attrs = dict(factory.extra_serializer_attrs)
+    fields_to_query = set(factory.extra_field_to_query)
+    prefetch_related = set(factory.prefetch_related)
+    select_related = set(factory.select_related)
+    prefetches = {}  # Prefetch lookup -> {'model', 'columns', 'select_related'} of the related model to load
+
+    concrete_fields = {field.name: field for field in model._meta.concrete_fields}
+    if not factory.fields:
+        fields = [field for field in model_fields if field not in factory.excluded_fields]
+        # Excluded columns, e.g. large text fields, are never loaded
+        fields_to_query.update(field for field in fields if field in concrete_fields)
+    else:
+        fields = []
+        for field in factory.fields:
+            if type(field) == str:
+                if field not in model_fields:
+                    raise ValueError('field {} not found in model {}'.format(field, model))
+                fields.append(field)
+                fields_to_query.add(field)
+            elif type(field) == tuple and len(field) == 2:
+                serializer_attrs[field[0]] = build_annotation_field(model, field[0], field[1])
+                fields.append(field[0])
+                if type(field[1]) == str:
+                    annotations[field[0]] = F(field[1])
+                    if field[1] in model_fields:
+                        fields_to_query.add(field[1])
+                elif is_expression(field[1]):
+                    annotations[field[0]] = field[1]
+                elif callable(field[1]):
+                    request_annotations[field[0]] = field[1]
+                else:
+                    raise ValueError(f'{field[0]} must be a lookup, an expression or a callable. Your\'s {field[1]}')
+            elif type(field) == tuple and len(field) == 3:
+                if field[1] in relations:
+                    info = relations[field[1]]
+                    serializer_attrs[field[0]] = SerializerMethodField()
+                    fields.append(field[0])
+                    if field[1] in model_fields:
+                        fields_to_query.add(field[1])
+                    if field[0] in factory.expandable_fields and field[0] not in factory.expanded_fields:
+                        # Only the primary keys are serialized until the client asks for ?expand=
+                        attname = None if info.to_many or info.reverse else model._meta.get_field(field[1]).attname
+                        serializer_attrs[f'get_{field[0]}'] = method_for_relation_pk(
+                            field[0], field[1], info.to_many, attname)
+                        if attname:
+                            continue
+                        columns = get_relation_columns(model, field[1], [])
+                    else:
+                        serializer = create_simple_serializer(info.related_model, field[2])
+                        serializer_attrs[f'get_{field[0]}'] = method_for_relation(
+                            field[0], field[1], serializer, info.to_many)
+                        columns = get_relation_columns(model, field[1], field[2])
+                    prefetches.setdefault(field[1], {'model': info.related_model, 'columns': set(),
+                                                     'select_related': set()})['columns'].update(columns)
+            elif type(field) == tuple and (len(field) == 4 or len(field) == 5):
+                serializer_attrs[field[0]] = SerializerMethodField()
+                serializer_attrs[f'get_{field[0]}'] = field[3]
+                fields.append(field[0])
+                fields_to_query.update(field[1])
+                prefetch_related.update(field[2])
+                if len(field) == 5:
+                    select_related.update(field[4])
+            else:
+                raise ValueError(f'field must be a string or tuple. Your\'s {field}')
+
+    columns, joins = infer_relations(model, [field for field in fields if field in model_fields],
+                                     factory.serializer_depth, relations=prefetches)
+    fields_to_query.update(columns)
+    select_related.update(joins)
+    # A deferred foreign key can not be traversed by select_related
+    fields_to_query.update(lookup.split('__')[0] for lookup in select_related)
+    # Many to many and reverse relations have no column
+    fields_to_query = {field for field in fields_to_query
+                       if '__' in field or field in concrete_fields or field not in relations}
+
+    declared = {get_lookup(lookup) for lookup in prefetch_related}
+    for lookup, relation in prefetches.items():
+        if any(name == lookup or name.startswith(f'{lookup}__') for name in declared):
+            # Declared prefetches take precedence. Method fields may read any column of a declared lookup
+            continue
+        queryset = relation['model']._default_manager.only(*sorted(relation['columns']))
+        if relation['select_related']:
+            queryset = queryset.select_related(*sorted(relation['select_related']))
+        prefetch_related.discard(lookup)
+        prefetch_related.add(Prefetch(lookup, queryset=queryset))
+    # Parents are prefetched before the lookups going through them
+    prefetch_related = sorted(prefetch_related, key=lambda lookup: (get_lookup(lookup).count('__'), get_lookup(lookup)))
+
+    return FactoryPlan(
+        fields=tuple(fields),
+        fields_to_query=frozenset(fields_to_query),
+        annotations=MappingProxyType(annotations),
+        request_annotations=MappingProxyType(request_annotations),
+        select_related=frozenset(select_related),
+        prefetch_related=tuple(prefetch_related),
+        serializer_attrs=MappingProxyType(serializer_attrs),
+    )
+
+
+def get_select_related_lookups(select_related, prefix='') -> list:
+    """
+    Flatten Query.select_related, e.g. {'problem': {'user': {}}} -> ['problem', 'problem__user']
+    """
+    lookups = []
+    for name, nested in (select_related or {}).items():
+        lookups.append(f'{prefix}{name}')
+        lookups.extend(get_select_related_lookups(nested, f'{prefix}{name}__'))
+    return lookups
+
+
+def describe_plan(factory) -> dict:
+    """
+    Dry-run report of the columns, joins and prefetches the factory's queryset uses, without running a query.
+    Joins and prefetches the factory did not declare are marked as inferred.
+
+    :param factory: ModelFactory instance
+    :return: {'fields', 'only', 'select_related', 'prefetch_related', 'annotations'}
+    """
+    plan = factory.get_plan()
+    declared_select = set(factory.select_related)
+    declared_prefetch = {get_lookup(lookup) for lookup in factory.prefetch_related}
+    for field in factory.fields:
+        if type(field) == tuple and len(field) in (4, 5):
+            declared_prefetch.update(field[2])
+            declared_select.update(field[4] if len(field) == 5 else [])
+    prefetch_related = []
+    for prefetch in plan.prefetch_related:
+        lookup = get_lookup(prefetch)
+        queryset = getattr(prefetch, 'queryset', None)
+        prefetch_related.append({
+            'lookup': lookup,
+            'only': sorted(queryset.query.deferred_loading[0]) if queryset is not None else [],
+            'select_related': get_select_related_lookups(queryset.query.select_related)
+            if queryset is not None and type(queryset.query.select_related) == dict else [],
+            'inferred': lookup not in declared_prefetch,
+        })
+    return {
+        'fields': list(plan.fields),
+        'only': sorted(plan.fields_to_query),
+        'select_related': [{'lookup': lookup, 'inferred': lookup not in declared_select}
+                           for lookup in sorted(plan.select_related)],
+        'prefetch_related': prefetch_related,
+        'annotations': {name: str(expression) for name, expression in plan.annotations.items()},
+    }
+
+
+def get_plan(factory) -> FactoryPlan:
+    """
+    Return the compiled plan of the factory, compiling it only once per fields variant
+
+    :param factory: ModelFactory instance
+    :return: FactoryPlan
+    """
+    key = (factory.__class__, factory.model, get_plan_fingerprint(factory))
+    return _plan_cache.get_or_create(key, lambda: compile_plan(factory))
+
+
+def clear_plan_cache(factory=None):
+    """
+    Invalidate compiled plans
+
+    :param factory: ModelFactory instance. If not passed, the whole cache is cleared
+    :return: None
+    """
+    if factory is None:
+        _plan_cache.remove()
+        return
+    _plan_cache.remove(lambda key: key[:2] == (factory.__class__, factory.model))
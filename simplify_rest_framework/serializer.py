@@ -1,4 +1,33 @@
-from rest_framework.serializers import ModelSerializer
+from django.db import models
+from rest_framework.fields import SerializerMethodField
+from rest_framework.serializers import ModelSerializer, ListSerializer
+
+from .hooks import call_hook
+from .lru import LRUCache
+
+# Serializer classes keyed by (factory class, model, fingerprint of the serializer options)
+_serializer_cache = LRUCache()
+
+
+class BatchedListSerializer(ListSerializer):
+    """
+    List serializer that serializes the nested relations of all rows in one pass
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        instances = list(iterable)
+        batched = {}
+        for name, field in self.child.fields.items():
+            if isinstance(field, SerializerMethodField):
+                serialize_relation = getattr(getattr(self.child, field.method_name), 'serialize_relation', None)
+                if serialize_relation:
+                    batched[name] = serialize_relation(instances)
+        self.child._batched_relations = batched
+        try:
+            return super().to_representation(instances)
+        finally:
+            self.child._batched_relations = None
 
 
 def create_new_serializer_class(super_self):
@@ -9,38 +38,53 @@ def create_new_serializer_class(super_self):
             depth = super_self.serializer_depth
             read_only_fields = super_self.readonly_fields
             extra_kwargs = super_self.get_extra_kwargs()
+            list_serializer_class = BatchedListSerializer
+
+        @property
+        def factory(self):
+            # Request scoped copy of the factory when used by a generated view set
+            return getattr(self.context.get('view'), 'factory', None) or super_self
 
         def validate(self, attrs):
-            if super_self.auto_user_field:
+            factory = self.factory
+            if factory.auto_user_field:
                 if self.context.get('request').user.is_authenticated:
-                    attrs[super_self.auto_user_field] = self.context['request'].user
-            if callable(super_self.validate):
-                attrs = super_self.validate(self, attrs)
+                    attrs[factory.auto_user_field] = self.context['request'].user
+            if callable(factory.validate):
+                attrs = call_hook(factory.validate, self, attrs)
             return super().validate(attrs)
 
         def create(self, validated_data):
-            if callable(super_self.create_instance):
-                obj = super_self.create_instance(self, validated_data)
+            factory = self.factory
+            if callable(factory.create_instance):
+                obj = call_hook(factory.create_instance, self, validated_data)
             else:
                 obj = super().create(validated_data)
-            for new_field, field in super_self.annotated_fields.items():
-                value = get_annotated_attrs(obj, field.name)
-                setattr(obj, new_field, value)
+            refresh_annotations(obj, factory.get_annotations(self.context.get('request')))
             return obj
 
         def update(self, instance, validated_data):
-            if callable(super_self.update_instance):
-                return super_self.update_instance(self, instance, validated_data)
-            return super().update(instance, validated_data)
+            factory = self.factory
+            if callable(factory.update_instance):
+                obj = call_hook(factory.update_instance, self, instance, validated_data)
+            else:
+                obj = super().update(instance, validated_data)
+            refresh_annotations(obj, factory.get_annotations(self.context.get('request')))
+            return obj
 
     return FactorySerializer
 
 
-def get_annotated_attrs(obj, name, pos=0):
-    if len(name.split('__')) > pos + 1:
-        return get_annotated_attrs(getattr(obj, name.split('__')[pos]), name, pos + 1)
-    elif len(name.split('__')) > pos:
-        return getattr(obj, name.split('__')[pos])
+def refresh_annotations(instance, annotations) -> None:
+    """
+    Set the annotated values of a written row with a single query
+    """
+    if not annotations or instance is None or instance.pk is None:
+        return
+    values = instance.__class__._default_manager.annotate(**annotations).filter(pk=instance.pk).values(
+        *annotations).first()
+    for name, value in (values or {}).items():
+        setattr(instance, name, value)
 
 
 def create_new_serializer(super_self, extra_attributes=None):
@@ -55,6 +99,58 @@ def create_new_serializer(super_self, extra_attributes=None):
     return type('FactorySerializer', (factory_serializer,), attributes)
 
 
+def make_fingerprint(value):
+    """
+    Converts factory options into a hashable value
+
+    :param value: Any option value (list, dict, tuple, callable, ...)
+    :return: Hashable fingerprint of the value
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(make_fingerprint(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(make_fingerprint(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted(((key, make_fingerprint(item)) for key, item in value.items()), key=repr))
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def get_serializer_fingerprint(super_self):
+    return make_fingerprint((super_self.fields, super_self.excluded_fields, super_self.readonly_fields,
+                             super_self.write_only_fields, super_self.extra_kwargs, super_self.serializer_depth,
+                             super_self.extra_serializer_attrs, super_self.expandable_fields,
+                             super_self.expanded_fields))
+
+
+def get_cached_serializer(super_self, extra_attributes=None):
+    """
+    Return the serializer class of the factory, building it only once per fields variant
+
+    :param super_self: ModelFactory instance
+    :param extra_attributes: Extra attributes of the serializer class
+    :return: Serializer class
+    """
+    key = (super_self.__class__, super_self.model, get_serializer_fingerprint(super_self))
+    return _serializer_cache.get_or_create(key, lambda: create_new_serializer(super_self, extra_attributes))
+
+
+def clear_serializer_cache(factory=None):
+    """
+    Invalidate cached serializer classes
+
+    :param factory: ModelFactory instance. If not passed, the whole cache is cleared
+    :return: None
+    """
+    if factory is None:
+        _serializer_cache.remove()
+        return
+    _serializer_cache.remove(lambda key: key[:2] == (factory.__class__, factory.model))
+
+
 def create_simple_serializer(model, fields):
     new_model = model
     all_fields = fields
@@ -0,0 +1,45 @@
+import json
+
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def dumps(data) -> str:
+    # Same output as rest_framework.renderers.JSONRenderer
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=not api_settings.UNICODE_JSON,
+                      allow_nan=not api_settings.STRICT_JSON,
+                      separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '))
+
+
+def stream_list(view, chunk_size: int) -> StreamingHttpResponse:
+    """
+    Stream the list action as a JSON array, serializing chunk_size rows at a time so memory stays flat
+
+    :param view: View set instance
+    :param chunk_size: Rows fetched, prefetched and serialized together
+    :return: StreamingHttpResponse
+    """
+    queryset = view.filter_queryset(view.get_queryset())
+    # iterator() ignores prefetch_related, so the lookups are applied to each chunk instead
+    lookups = queryset._prefetch_related_lookups
+    queryset = queryset.prefetch_related(None)
+
+    def serialize(rows):
+        prefetch_related_objects(rows, *lookups)
+        return ','.join(dumps(row) for row in view.get_serializer(rows, many=True).data)
+
+    def content():
+        yield '['
+        rows, first = [], True
+        for row in queryset.iterator(chunk_size=chunk_size):
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield serialize(rows) if first else ',' + serialize(rows)
+                rows, first = [], False
+        if rows:
+            yield serialize(rows) if first else ',' + serialize(rows)
+        yield ']'
+
+    return StreamingHttpResponse(content(), content_type='application/json')
@@ -0,0 +1,232 @@
+"""
+Test utilities to catch N+1 queries in the list endpoints of registered factories.
+
+Usage::
+
+    class FactoriesTestCase(TestCase):
+        def test_no_n_plus_one(self):
+            assert_factories_no_n_plus_one(user=User.objects.create_superuser('admin'))
+"""
+import datetime
+import decimal
+import itertools
+import uuid
+
+from django.db import connection, models
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.utils import model_meta
+
+from .view_set import create_view_set
+from .views import factories
+
+_counter = itertools.count(1)
+
+
+def dummy_value(field: models.Field):
+    """
+    Return a value satisfying a required model field
+    """
+    number = next(_counter)
+    if field.choices:
+        return field.choices[0][0]
+    if isinstance(field, models.EmailField):
+        return f'user{number}@example.com'
+    if isinstance(field, (models.CharField, models.TextField)):
+        value = f'{field.name} {number}'
+        return value[-field.max_length:] if field.max_length else value
+    if isinstance(field, models.BooleanField):
+        return False
+    if isinstance(field, models.IntegerField):
+        return number
+    if isinstance(field, models.DecimalField):
+        return decimal.Decimal(number % 10 ** (field.max_digits - field.decimal_places))
+    if isinstance(field, models.FloatField):
+        return float(number)
+    if isinstance(field, models.DateTimeField):
+        return timezone.now()
+    if isinstance(field, models.DateField):
+        return datetime.date.today()
+    if isinstance(field, models.TimeField):
+        return datetime.time()
+    if isinstance(field, models.DurationField):
+        return datetime.timedelta(seconds=number)
+    if isinstance(field, models.UUIDField):
+        return uuid.uuid4()
+    if isinstance(field, models.JSONField):
+        return {}
+    raise ValueError(f'Can not generate a value for {field.model.__name__}.{field.name}, pass your own seed')
+
+
+def seed_instance(model, depth=0, **values):
+    """
+    Create a row of the model filling every required field, including required foreign keys
+
+    :param model: Subclass of django.db.models.Model
+    :param depth: Current depth of required foreign keys
+    :param values: Values of the row
+    :return: Model instance
+    """
+    for field in model._meta.concrete_fields:
+        if field.name in values or field.attname in values or field.primary_key:
+            continue
+        if field.null or field.has_default() or getattr(field, 'auto_now', False) or \
+                getattr(field, 'auto_now_add', False):
+            continue
+        if field.is_relation:
+            if depth > 5:
+                raise ValueError(f'Required foreign keys of {model.__name__} are nested too deep')
+            values[field.name] = seed_instance(field.related_model, depth + 1)
+        elif field.blank and isinstance(field, (models.CharField, models.TextField)):
+            values[field.name] = ''
+        else:
+            values[field.name] = dummy_value(field)
+    return model._default_manager.create(**values)
+
+
+def seed_relations(instance, relations, count=2):
+    """
+    Add related rows for each relation of the instance
+
+    :param instance: Model instance
+    :param relations: Relation names of the model
+    :param count: Number of related rows added to each to-many relation
+    :return: None
+    """
+    field_info = model_meta.get_field_info(instance.__class__)
+    for relation in relations:
+        info = field_info.relations.get(relation)
+        if info is None or info.has_through_model:
+            continue
+        if not info.to_many and not info.reverse:
+            if getattr(instance, info.model_field.attname) is None:
+                setattr(instance, relation, seed_instance(info.related_model))
+                instance.save()
+        elif info.reverse and not info.to_many:
+            remote_field = getattr(instance.__class__, relation).related.field
+            if not hasattr(instance, relation):
+                seed_instance(info.related_model, **{remote_field.name: instance})
+        elif info.reverse and not getattr(instance.__class__, relation).rel.many_to_many:
+            remote_field = getattr(instance.__class__, relation).field
+            for _ in range(count):
+                seed_instance(info.related_model, **{remote_field.name: instance})
+        else:
+            getattr(instance, relation).add(*[seed_instance(info.related_model) for _ in range(count)])
+
+
+def get_factory_relations(factory) -> set:
+    """
+    Relation names of the model used by the serialized fields of the factory
+    """
+    plan = factory.get_plan()
+    relations = model_meta.get_field_info(factory.model).relations
+    names = {getattr(lookup, 'prefetch_to', lookup).split('__')[0] for lookup in plan.prefetch_related}
+    names.update(lookup.split('__')[0] for lookup in plan.select_related)
+    names.update(field for field in plan.fields if field in relations)
+    return {name for name in names if name in relations}
+
+
+def seed_factory(factory, count):
+    """
+    Create rows of the factory's model with their relations
+    """
+    relations = get_factory_relations(factory)
+    for _ in range(count):
+        seed_relations(seed_instance(factory.model), relations)
+
+
+def build_view(view_set, user=None, action='list', **kwargs):
+    request = APIRequestFactory().get('/')
+    if user is not None:
+        force_authenticate(request, user=user)
+    view = view_set(action_map={'get': action})
+    view.args, view.kwargs = (), kwargs
+    view.format_kwarg = None
+    view.request = view.initialize_request(request)
+    return view
+
+
+def count_list_queries(view_set, user=None) -> int:
+    """
+    Number of queries issued by a GET on the list endpoint of the view set
+    """
+    request = APIRequestFactory().get('/')
+    if user is not None:
+        force_authenticate(request, user=user)
+    with CaptureQueriesContext(connection) as queries:
+        response = view_set.as_view({'get': 'list'})(request)
+        response.render()
+    if response.status_code != 200:
+        raise AssertionError(f'List endpoint returned {response.status_code}: {response.content[:200]}')
+    return len(queries)
+
+
+def find_n_plus_one_fields(view_set, user=None) -> dict:
+    """
+    Serializer fields issuing queries while serializing already fetched rows
+
+    :return: {field name: number of queries}
+    """
+    view = build_view(view_set, user=user)
+    instances = list(view.filter_queryset(view.get_queryset()))
+    serializer = view.get_serializer(instances, many=True)
+    child = getattr(serializer, 'child', serializer)
+    offending = {}
+    for name, field in child.fields.items():
+        if field.write_only:
+            continue
+        with CaptureQueriesContext(connection) as queries:
+            for instance in instances:
+                attribute = field.get_attribute(instance)
+                if attribute is not None:
+                    field.to_representation(attribute)
+        if len(queries):
+            offending[name] = len(queries)
+    return offending
+
+
+def assert_no_n_plus_one(factory, n=3, user=None, seed=None):
+    """
+    Seed N and then 2N rows and assert the list endpoint runs the same number of queries
+
+    :param factory: Registered ModelFactory instance
+    :param n: Number of rows added in each round
+    :param user: User making the requests
+    :param seed: Callable(factory, count) creating rows. Defaults to seed_factory
+    :return: None
+    """
+    seed = seed or seed_factory
+    view_set = create_view_set(factory, metrics_sinks=[])
+    seed(factory, n)
+    first = count_list_queries(view_set, user=user)
+    seed(factory, n)
+    second = count_list_queries(view_set, user=user)
+    if second > first:
+        offending = find_n_plus_one_fields(view_set, user=user)
+        details = ', '.join(f'{name} ({count} queries)' for name, count in offending.items()) or 'unknown fields'
+        raise AssertionError(f'{factory.model.__name__}.{factory.__class__.__name__}: list endpoint ran {first} '
+                             f'queries for {n} rows and {second} queries for {2 * n} rows. '
+                             f'Fields issuing queries per row: {details}')
+
+
+def assert_factories_no_n_plus_one(container=factories, n=3, user=None, exclude=()):
+    """
+    Run assert_no_n_plus_one on every registered factory
+
+    :param container: ModelFactoryContainer
+    :param n: Number of rows added in each round
+    :param user: User making the requests
+    :param exclude: Registration keys to skip, e.g. 'Problem.ProblemFactory'
+    :return: None
+    """
+    errors = []
+    for key, factory in container._registered_model_factories.items():
+        if key in exclude or 'list' in factory.disabled_actions:
+            continue
+        try:
+            assert_no_n_plus_one(factory, n=n, user=user)
+        except AssertionError as e:
+            errors.append(str(e))
+    if errors:
+        raise AssertionError('\n'.join(errors))
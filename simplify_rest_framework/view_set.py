@@ -1,69 +1,152 @@
+from rest_framework.decorators import action
 from rest_framework.exceptions import MethodNotAllowed
 from rest_framework.viewsets import ModelViewSet
 
+from .async_view_set import create_async_view_set
+from .bulk import bulk, get_bulk_methods
+from .cache import cache_response, connect_cache_invalidation, get_cached_response
+from .conditional import get_not_modified_response, set_validators
+from .fast_read import fast_list
+from .filters import RequestFilterBackend
+from .hooks import call_hook
+from .instrumentation import instrument_view_set
+from .pagination import get_pagination_class
+from .streaming import stream_list
+
+
+def create_view_set(factory_class, metrics_sinks=None):
+    """
+    Create a ModelViewSet for a registered factory
+
+    :param factory_class: ModelFactory instance
+    :param metrics_sinks: Callables receiving (metrics, request, response) of each action.
+    Defaults to factory_class.metrics_sinks
+    :return: ModelViewSet class
+    """
+    metrics_sinks = factory_class.metrics_sinks if metrics_sinks is None else metrics_sinks
+    if factory_class.async_views and factory_class.streaming_list:
+        raise ValueError('streaming_list is not supported with async_views')
+    connect_cache_invalidation(factory_class)
+    backends = list(factory_class.filter_backends)
+    if factory_class.request_filters and RequestFilterBackend not in backends:
+        backends.append(RequestFilterBackend)
 
-def create_view_set(factory_class):
     class FactoryViewSet(ModelViewSet):
         authentication_classes = factory_class.authentication_classes
         filterset_fields = factory_class.filterset_fields
-        filter_backends = factory_class.filter_backends
+        filter_backends = backends
         http_method_names = factory_class.http_method_names
         lookup_field = factory_class.lookup_field
         lookup_url_kwarg = factory_class.lookup_url_kwarg
-        pagination_class = factory_class.pagination_class
+        pagination_class = get_pagination_class(factory_class)
         renderer_classes = factory_class.renderer_classes
         search_fields = factory_class.search_fields
+        _factory = None
+        conditional_validators = None
+
+        @property
+        def factory(self):
+            # Each request works on its own copy of the registered factory
+            if self._factory is None:
+                self._factory = factory_class.for_request(self)
+            return self._factory
 
         def get_permissions(self):
-            if callable(factory_class.get_permissions):
-                return factory_class.get_permissions(self)
+            if callable(self.factory.get_permissions):
+                return self.factory.get_permissions(self)
             return super().get_permissions()
 
         def get_serializer_class(self):
-            if callable(factory_class.get_serializer_class):
-                return factory_class.get_serializer_class(self)
+            if callable(self.factory.get_serializer_class):
+                return self.factory.get_serializer_class(self)
             return super().get_serializer_class()
 
         def get_object(self):
-            if callable(factory_class.get_object):
-                return factory_class.get_object(self)
-            return super().get_object()
+            if callable(self.factory.get_object):
+                self.factory.object = call_hook(self.factory.get_object, self)
+            else:
+                self.factory.object = super().get_object()
+            return self.factory.object
 
         def get_queryset(self):
-            if callable(factory_class.get_queryset):
-                return factory_class.get_queryset(self)
-            return super().get_queryset()
+            if callable(self.factory.get_queryset):
+                return self.factory.filter_rows(self, call_hook(self.factory.get_queryset, self))
+            return self.factory.filter_rows(self, super().get_queryset())
+
+        def filter_queryset(self, queryset):
+            queryset = super().filter_queryset(queryset)
+            if self.action == 'list':
+                # Queryset-level counterparts of object permissions, e.g. IsOwner lists the owned rows only
+                for permission in self.get_permissions():
+                    if hasattr(permission, 'filter_queryset'):
+                        queryset = permission.filter_queryset(self.request, queryset, self)
+            return queryset
+
+        def finalize_response(self, request, response, *args, **kwargs):
+            response = super().finalize_response(request, response, *args, **kwargs)
+            cache_response(self, request, response)
+            if self.conditional_validators and response.status_code == 200:
+                set_validators(response, *self.conditional_validators)
+            return response
 
         # ['list', 'retrieve', 'create', 'update', 'partial_update', 'destroy']
         def list(self, request, *args, **kwargs):
-            if 'list' in factory_class.disabled_actions:
+            if 'list' in self.factory.disabled_actions:
                 # raise method not allowed drf
                 raise MethodNotAllowed(request.method)
+            not_modified = get_not_modified_response(self, request)
+            if not_modified:
+                return not_modified
+            if self.factory.streaming_list:
+                return stream_list(self, self.factory.streaming_chunk_size)
+            cached = get_cached_response(self, request)
+            if cached:
+                return cached
+            if self.factory.fast_read:
+                response = fast_list(self)
+                if response is not None:
+                    return response
             return super().list(request, *args, **kwargs)
 
         def retrieve(self, request, *args, **kwargs):
-            if 'retrieve' in factory_class.disabled_actions:
+            if 'retrieve' in self.factory.disabled_actions:
                 raise MethodNotAllowed(request.method)
-            return super().retrieve(request, *args, **kwargs)
+            return (get_not_modified_response(self, request) or get_cached_response(self, request) or
+                    super().retrieve(request, *args, **kwargs))
 
         def create(self, request, *args, **kwargs):
-            if 'create' in factory_class.disabled_actions:
+            if 'create' in self.factory.disabled_actions:
                 raise MethodNotAllowed(request.method)
             return super().create(request, *args, **kwargs)
 
         def update(self, request, *args, **kwargs):
-            if 'update' in factory_class.disabled_actions:
+            if 'update' in self.factory.disabled_actions:
                 raise MethodNotAllowed(request.method)
             return super().update(request, *args, **kwargs)
 
         def partial_update(self, request, *args, **kwargs):
-            if 'partial_update' in factory_class.disabled_actions:
+            if 'partial_update' in self.factory.disabled_actions:
                 raise MethodNotAllowed(request.method)
             return super().partial_update(request, *args, **kwargs)
 
         def destroy(self, request, *args, **kwargs):
-            if 'destroy' in factory_class.disabled_actions:
+            if 'destroy' in self.factory.disabled_actions:
                 raise MethodNotAllowed(request.method)
             return super().destroy(request, *args, **kwargs)
 
+    bulk_methods = get_bulk_methods(factory_class)
+    if bulk_methods:
+        # Only factories with bulk_actions get the bulk/ route
+        def bulk_action(self, request, *args, **kwargs):
+            return bulk(self, request)
+
+        bulk_action.__name__ = 'bulk'
+        FactoryViewSet.bulk = action(detail=False, methods=bulk_methods, url_path='bulk')(bulk_action)
+
+    if factory_class.async_views:
+        FactoryViewSet = create_async_view_set(FactoryViewSet)
+
+    if metrics_sinks:
+        factory_name = f'{factory_class.model.__name__}.{factory_class.__class__.__name__}'
+        return instrument_view_set(FactoryViewSet, factory_name, metrics_sinks)
     return FactoryViewSet
@@ -1,11 +1,14 @@
 from typing import Type
 
+from django.apps import apps
 from django.core.exceptions import ImproperlyConfigured
 from django.db.models.base import Model
 from rest_framework.routers import DefaultRouter
 from rest_framework.viewsets import ModelViewSet
 
 from .model_factory import ModelFactory
+from .plan import clear_plan_cache
+from .serializer import clear_serializer_cache
 from .view_set import create_view_set
 
 
@@ -35,18 +38,26 @@ class ModelFactoryContainer:
 
         :param model: Subclass of django.db.models.Model
         :param factory_class: Subclass of ModelFactory
-        :param options:
+        :param options: Factory attributes to override, e.g. pagination_style='keyset'
         :return: None
         """
         factory_class = factory_class or ModelFactory
         factory_class = factory_class()
         factory_class.model = model
+        for name, value in options.items():
+            if not hasattr(factory_class, name):
+                raise ValueError(f'{factory_class.__class__.__name__} has no option {name}')
+            setattr(factory_class, name, value)
         if not issubclass(model, Model):
             raise TypeError('Only model can be registered')
         if model._meta.abstract:
             raise ImproperlyConfigured(
                 f'The model {model.__name__} is abstract, so it cannot be registered with factory.'
             )
+        if apps.ready:
+            # Compile the plan and permissions at registration so configuration errors surface at startup
+            factory_class.get_plan()
+            factory_class.get_permissions(None)
         self._registered_model_factories[f'{model.__name__}.{factory_class.__class__.__name__}'] = factory_class
 
     def get_urls(self) -> list:
@@ -87,6 +98,8 @@ class ModelFactoryContainer:
         factory_key = f'{model.__name__}.{factory_class.__class__.__name__}'
         if factory_key in self._registered_model_factories:
             del self._registered_model_factories[factory_key]
+            clear_plan_cache(factory_class)
+            clear_serializer_cache(factory_class)
         else:
             raise ValueError(f'{factory_key} is not registered')
 